@@ -1,12 +1,40 @@
-from fastapi import FastAPI
+import asyncio
+import hmac
+import json
+import os
+
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from typing import Any, Dict, List, Optional
+
+import numpy as np
 
-from rag.retriever import retrieve
-from rag.utils import rerank, infer_intent
+from rag.retriever import (
+    IndexSnapshot,
+    aencode_queries,
+    aretrieve_many,
+    get_snapshot,
+    reload_index,
+    retrieve_lexical,
+    warmup,
+    watch_index,
+)
+from rag.store import Hits
+from rag.utils import rerank
+from rag.utils.intent import ainfer_intent_with_source, get_chain, normalize_query
+from rag.utils import metrics
+from rag.utils.rerank import build_search_keywords
+from rag.utils.response_cache import RESPONSE_CACHE_SIZE, ResponseCache
+from rag.utils.semantic_cache import SEMANTIC_CACHE_CANDIDATES, semantic_cache
+from rag.utils.timing import stage
 
 app = FastAPI()
 
+# Per-stage timers on the recommend endpoints, exported as a Server-Timing
+# header and on /metrics.
+app.add_middleware(metrics.MetricsMiddleware, paths=["/recommend", "/recommend/batch"])
+
 TEST_TYPE_MAPPING = {
     "A": "Ability & Aptitude",
     "B": "Biodata & Situational Judgement",
@@ -18,6 +46,39 @@ TEST_TYPE_MAPPING = {
     "S": "Simulations"
 }
 
+RETRIEVAL_K = 100
+EXPANSION_K = 20
+LEXICAL_K = 20
+
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "256"))
+BATCH_INTENT_CONCURRENCY = int(os.getenv("BATCH_INTENT_CONCURRENCY", "8"))
+
+# Seconds between checks for a newly published index snapshot (0 = only
+# reload through /admin/reload). That endpoint is disabled unless
+# ADMIN_TOKEN is set, and then requires it in X-Admin-Token.
+INDEX_WATCH_INTERVAL = float(os.getenv("INDEX_WATCH_INTERVAL", "0"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Start the primary vector search while the intent is still being worked
+# out (opt-in). Queries that reach the LLM then encode the query and the
+# keyword expansions in two encoder passes instead of one batched pass,
+# which only pays off when the encoder has spare capacity during LLM calls.
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "0") == "1"
+
+# Finished responses by (normalized query, index version); see
+# rag/utils/response_cache.py. RESPONSE_CACHE_SIZE=0 turns it off.
+response_cache = ResponseCache() if RESPONSE_CACHE_SIZE > 0 else None
+
+# Fixed expansion queries per intent signal. They never change between
+# requests, so their embeddings and neighbours are precomputed at startup.
+EXPANSION_QUERIES = {
+    "sales": "sales negotiation business development commercial awareness",
+    "leadership": "leadership management executive strategy people management opq",
+    "admin": "administrative clerical data entry typing microsoft office",
+    "marketing": "marketing digital brand strategy creative",
+    "behavioral": "workplace collaboration interpersonal skills teamwork communication culture",
+}
+
 def map_test_types(test_types: List[str]) -> List[str]:
     return [TEST_TYPE_MAPPING.get(t, t) for t in test_types]
 
@@ -25,62 +86,256 @@ class QueryRequest(BaseModel):
     query: str
     top_k: int = 5
 
-@app.post("/recommend")
-def recommend(req: QueryRequest):
-    intent = infer_intent(req.query)
-    
-    retrieval_k = 100
-    candidates = retrieve(req.query, k=retrieval_k)
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    top_k: int = 5
+
+@app.on_event("startup")
+def warm_up():
+    # Load everything the first request would otherwise pay for.
+    warmup(EXPANSION_QUERIES.values(), k=EXPANSION_K)
+    get_chain()
 
+    if INDEX_WATCH_INTERVAL > 0:
+        watch_index(INDEX_WATCH_INTERVAL)
+
+def expansion_queries(intent: Dict[str, Any]) -> List[str]:
     queries_to_add = []
     
     if "sales" in intent["categories"]:
-        queries_to_add.append("sales negotiation business development commercial awareness")
+        queries_to_add.append(EXPANSION_QUERIES["sales"])
     
     if "leadership" in intent["categories"]:
-        queries_to_add.append("leadership management executive strategy people management opq")
+        queries_to_add.append(EXPANSION_QUERIES["leadership"])
     
     if "admin" in intent["categories"]:
-        queries_to_add.append("administrative clerical data entry typing microsoft office")
+        queries_to_add.append(EXPANSION_QUERIES["admin"])
         
     if "marketing" in intent["categories"]:
-        queries_to_add.append("marketing digital brand strategy creative")
+        queries_to_add.append(EXPANSION_QUERIES["marketing"])
     
     if "tech" in intent["categories"]:
         queries_to_add.extend(intent["explicit_keywords"])
 
     if intent["behavioral"]:
-        queries_to_add.append("workplace collaboration interpersonal skills teamwork communication culture")
+        queries_to_add.append(EXPANSION_QUERIES["behavioral"])
+
+    return queries_to_add
 
-    for q_add in queries_to_add:
-         candidates.extend(retrieve(q_add, k=20))
+def dedup_rows(retrieved: List[Hits]) -> np.ndarray:
+    # First occurrence wins, in retrieval order. indexing.py refuses a
+    # catalog with repeated URLs, so row ids dedup exactly like URLs did.
+    rows = np.concatenate([hits.rows for hits in retrieved])
+    _, first = np.unique(rows, return_index=True)
+    return rows[np.sort(first)]
 
-    seen = set()
-    unique_candidates = []
-    for item in candidates:
-        if item["url"] not in seen:
-            seen.add(item["url"])
-            unique_candidates.append(item)
+def recommend_from_retrieved(
+    query: str,
+    intent: Dict[str, Any],
+    retrieved: List[Hits],
+    top_k: int,
+    snapshot: Optional[IndexSnapshot] = None,
+):
+    # Row ids are only meaningful within the snapshot that produced them.
+    snapshot = snapshot or get_snapshot()
 
-    ranked = rerank(unique_candidates, req.query, top_k=req.top_k)
+    # Keyword matches the vector search missed join the pool after it.
+    metrics.CANDIDATES.observe(sum(len(hits.rows) for hits in retrieved), source="vector")
+    with stage("lexical"):
+        keywords = build_search_keywords(query, intent)
+        if keywords:
+            lexical = retrieve_lexical(keywords, k=LEXICAL_K, snapshot=snapshot)
+            metrics.CANDIDATES.observe(len(lexical.rows), source="lexical")
+            retrieved = retrieved + [lexical]
+
+    with stage("dedup"):
+        unique_rows = dedup_rows(retrieved)
+    metrics.CANDIDATES.observe(len(unique_rows), source="unique")
+
+    with stage("rerank"):
+        ranked = rerank(
+            unique_rows,
+            query,
+            top_k=top_k,
+            intent=intent,
+            features=snapshot.features
+        )
     
-    if not ranked and unique_candidates:
-        ranked = unique_candidates[:req.top_k]
+    if not ranked and len(unique_rows):
+        ranked = unique_rows[:top_k].tolist()
 
+    store = snapshot.store
     recommended_assessments = []
-    for item in ranked:
-        recommended_assessments.append({
-            "url": item["url"],
-            "name": item["name"],
-            "adaptive_support": item["adaptive_support"],
-            "description": item["description"],
-            "duration": item["duration"],
-            "remote_support": item["remote_support"],
-            "test_type": map_test_types(item["test_type"])
-        })
+    with stage("serialize"):
+        for row in ranked:
+            item = store.item(row)
+            item["test_type"] = map_test_types(item["test_type"])
+            recommended_assessments.append(item)
 
     return {"recommended_assessments": recommended_assessments}
 
+def cache_response(query: str, top_k: int, source: str, snapshot: IndexSnapshot, result: Dict[str, Any]):
+    # Intents from the fallback path (LLM unavailable or past its deadline)
+    # or borrowed from a paraphrase are not what the LLM would answer for
+    # this query, so those responses are not kept.
+    if response_cache is not None and top_k > 0 and source not in ("fallback", "timeout", "semantic"):
+        response_cache.put(query, top_k, snapshot.version, result["recommended_assessments"])
+
+@app.post("/recommend")
+async def recommend(req: QueryRequest):
+    snapshot = get_snapshot()
+    if response_cache is not None and req.top_k > 0:
+        with stage("cache"):
+            body = await response_cache.aget(req.query, req.top_k, snapshot.version)
+        if body is not None:
+            return Response(content=body, media_type="application/json")
+
+    # The query is encoded at most once, when first needed: by the
+    # semantic intent cache or by the speculative primary retrieval.
+    encoded: Optional[asyncio.Future] = None
+
+    async def embed() -> np.ndarray:
+        nonlocal encoded
+        if encoded is None:
+            encoded = asyncio.ensure_future(aencode_queries([req.query]))
+        return (await asyncio.shield(encoded))[0]
+
+    async def retrieve_primary() -> Hits:
+        embedding = await embed()
+        with stage("retrieve"):
+            hits = await aretrieve_many([req.query], [RETRIEVAL_K], snapshot, {req.query: embedding})
+        return hits[0]
+
+    # The primary retrieval does not depend on the intent, so it starts
+    # right away and overlaps the LLM call; expansions follow as soon as
+    # the intent is known.
+    primary_task = asyncio.ensure_future(retrieve_primary()) if SPECULATIVE_RETRIEVAL else None
+    try:
+        with stage("intent"):
+            intent, source = await ainfer_intent_with_source(req.query, embed=embed)
+        queries_to_add = expansion_queries(intent)
+
+        if primary_task is None or source in ("cache", "fast_path"):
+            # Nothing to overlap (cache and fast-path answers return without
+            # yielding, so the speculative task never ran): the query and its
+            # expansions share one encode + FAISS search.
+            if primary_task is not None:
+                primary_task.cancel()
+            embeddings = {req.query: await embed()} if encoded is not None else None
+            with stage("retrieve"):
+                retrieved = await aretrieve_many(
+                    [req.query] + queries_to_add,
+                    [RETRIEVAL_K] + [EXPANSION_K] * len(queries_to_add),
+                    snapshot,
+                    embeddings
+                )
+        else:
+            primary = None
+            if semantic_cache is not None and SEMANTIC_CACHE_CANDIDATES and source == "semantic":
+                match = semantic_cache.peek(await embed())
+                if match is not None:
+                    primary = match.entry.hits.get(snapshot.version)
+
+            with stage("expand"):
+                expanded = await aretrieve_many(
+                    queries_to_add, [EXPANSION_K] * len(queries_to_add), snapshot
+                ) if queries_to_add else []
+            if primary is None:
+                primary = await primary_task
+            retrieved = [primary] + expanded
+    finally:
+        if primary_task is not None:
+            primary_task.cancel()
+
+    if semantic_cache is not None and SEMANTIC_CACHE_CANDIDATES and source == "llm" and encoded is not None:
+        semantic_cache.set_hits(normalize_query(req.query), snapshot.version, retrieved[0])
+
+    result = recommend_from_retrieved(req.query, intent, retrieved, req.top_k, snapshot)
+    cache_response(req.query, req.top_k, source, snapshot, result)
+    return result
+
+@app.post("/recommend/batch")
+async def recommend_batch(req: BatchQueryRequest):
+    if len(req.queries) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {MAX_BATCH_SIZE} queries per batch"
+        )
+
+    snapshot = get_snapshot()
+    semaphore = asyncio.Semaphore(BATCH_INTENT_CONCURRENCY)
+
+    cached = {}
+    if response_cache is not None and req.top_k > 0:
+        with stage("cache"):
+            for index, query in enumerate(req.queries):
+                items = await response_cache.aitems(query, req.top_k, snapshot.version)
+                if items is not None:
+                    cached[index] = items
+
+    async def indexed_intent(index: int, query: str):
+        async with semaphore:
+            return (index, query, *await ainfer_intent_with_source(query))
+
+    async def stream():
+        for index, items in cached.items():
+            yield json.dumps({"index": index, "query": req.queries[index], "recommended_assessments": items}) + "\n"
+
+        pending = {
+            asyncio.ensure_future(indexed_intent(index, query))
+            for index, query in enumerate(req.queries)
+            if index not in cached
+        }
+        try:
+            while pending:
+                # Intents overlap, so the stage is the time spent waiting on them.
+                with stage("intent"):
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+                # Everything whose intent is ready shares one encode + search.
+                group = [task.result() for task in done]
+                queries, ks, spans = [], [], []
+                for _, query, intent, _ in group:
+                    queries_to_add = expansion_queries(intent)
+                    start = len(queries)
+                    queries.extend([query] + queries_to_add)
+                    ks.extend([RETRIEVAL_K] + [EXPANSION_K] * len(queries_to_add))
+                    spans.append((start, len(queries)))
+
+                with stage("retrieve"):
+                    retrieved = await aretrieve_many(queries, ks, snapshot)
+
+                for (index, query, intent, source), (start, end) in zip(group, spans):
+                    result = recommend_from_retrieved(query, intent, retrieved[start:end], req.top_k, snapshot)
+                    cache_response(query, req.top_k, source, snapshot, result)
+                    yield json.dumps({"index": index, "query": query, **result}) + "\n"
+        finally:
+            for task in pending:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.post("/admin/reload")
+async def admin_reload(force: bool = False, x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest((x_admin_token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+    loop = asyncio.get_running_loop()
+    reloaded, version = await loop.run_in_executor(None, reload_index, force)
+    return {"reloaded": reloaded, "index_version": version}
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/health")
 def health():
-    return {"status": "healthy"}
\ No newline at end of file
+    snapshot = get_snapshot()
+    return {
+        "status": "healthy",
+        "index_version": snapshot.version,
+        "index_type": snapshot.info["type"],
+        "items": len(snapshot.store),
+    }
\ No newline at end of file
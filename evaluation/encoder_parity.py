@@ -0,0 +1,132 @@
+import argparse
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from app import EXPANSION_K, RETRIEVAL_K, expansion_queries, recommend_from_retrieved
+from evaluation.recallcsv import GROUND_TRUTH_CSV, K, load_ground_truth, normalize_url, recall_at_k
+from rag import retriever
+from rag.encoders import BACKENDS, load_encoder
+from rag.utils.classifier import classify_intent
+
+QUERY_CSVS = ["data/result/val.csv", "data/result/test.csv"]
+NEIGHBOURS_K = 10
+REFERENCE = "torch"
+
+# Compares each query-encoder backend with the full-precision PyTorch model:
+# embedding agreement, FAISS neighbour overlap, end-to-end Recall@10 on the
+# validation set (scored exactly like evaluation/recallcsv.py) and encode
+# latency. Intents come from the local classifier so runs are deterministic
+# and do not need Ollama.
+
+
+def recommend_slugs(queries: List[str]) -> Dict[str, List[str]]:
+    predictions = {}
+    for query in queries:
+        intent = classify_intent(query)[0]
+        queries_to_add = expansion_queries(intent)
+        retrieved = retriever.retrieve_many(
+            [query] + queries_to_add,
+            [RETRIEVAL_K] + [EXPANSION_K] * len(queries_to_add)
+        )
+        result = recommend_from_retrieved(query, intent, retrieved, K)
+        predictions[query] = [normalize_url(item["url"]) for item in result["recommended_assessments"]]
+    return predictions
+
+
+def time_encoder(encoder, queries: List[str], repeat: int) -> Dict[str, float]:
+    # Per-request cost is one short query at a time; batch throughput is the
+    # /recommend/batch and offline evaluation case.
+    encoder.encode(queries[:1])
+
+    single = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            encoder.encode([query])
+            single.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encoder.encode(queries)
+    batch = (time.perf_counter() - start) / repeat
+
+    single_ms = np.array(single) * 1000
+    return {
+        "p50_ms": float(np.percentile(single_ms, 50)),
+        "p95_ms": float(np.percentile(single_ms, 95)),
+        "batch_qps": len(queries) / batch,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency parity of query-encoder backends.")
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions over the query set")
+    parser.add_argument("--max-recall-drop", type=float, default=0.01,
+                        help="Fail if a backend's Mean Recall@10 is this much below the PyTorch model")
+    args = parser.parse_args()
+
+    queries = []
+    for path in QUERY_CSVS:
+        queries.extend(pd.read_csv(path)["Query"].unique())
+    queries = list(dict.fromkeys(queries))
+    gt_map = load_ground_truth(pd.read_csv(GROUND_TRUTH_CSV))
+
+    backends = [REFERENCE] + [b for b in args.backends if b != REFERENCE]
+    reference_emb = None
+    reference_ids = None
+    reference_recall = None
+    reference_p50 = None
+    failed = []
+
+    for backend in backends:
+        start = time.perf_counter()
+        encoder = load_encoder(backend)
+        load_s = time.perf_counter() - start
+        retriever.set_encoder(encoder)
+        index = retriever.get_snapshot().index
+
+        emb = encoder.encode(queries)
+        _, ids = index.search(emb, NEIGHBOURS_K)
+
+        predictions = recommend_slugs(list(gt_map))
+        recall = float(np.mean([
+            recall_at_k(predictions.get(query, []), relevant, K)
+            for query, relevant in gt_map.items()
+        ]))
+
+        timing = time_encoder(encoder, queries, args.repeat)
+
+        if backend == REFERENCE:
+            reference_emb, reference_ids = emb, ids
+            reference_recall, reference_p50 = recall, timing["p50_ms"]
+
+        cosine = np.sum(emb * reference_emb, axis=1)
+        overlap = np.mean([
+            len(set(a) & set(b)) / NEIGHBOURS_K for a, b in zip(ids, reference_ids)
+        ])
+
+        print(f"== {backend} (loaded in {load_s:.1f}s)")
+        print(f"Cosine vs {REFERENCE}: mean {cosine.mean():.4f} | min {cosine.min():.4f}")
+        print(f"Top-{NEIGHBOURS_K} neighbour overlap vs {REFERENCE}: {overlap:.3f}")
+        print(f"Mean Recall@{K}: {recall:.4f} ({recall - reference_recall:+.4f} vs {REFERENCE})")
+        print(
+            f"Encode latency: p50 {timing['p50_ms']:.2f} ms | p95 {timing['p95_ms']:.2f} ms | "
+            f"batch {timing['batch_qps']:.0f} queries/s | "
+            f"speedup {reference_p50 / timing['p50_ms']:.2f}x\n"
+        )
+
+        if reference_recall - recall > args.max_recall_drop:
+            failed.append(backend)
+
+    if failed:
+        print(f"Recall parity failed for: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import argparse
+import os
+import time
+from typing import Dict, List
+
+import faiss
+import numpy as np
+import pandas as pd
+
+from rag.encoders import load_encoder
+from rag.index_types import build_index, configure_search
+from rag.indexing import EMBEDDINGS_PATH, PROCESSED_DIR
+from rag.snapshots import current_dir, snapshot_paths
+
+QUERY_CSVS = ["data/result/val.csv", "data/result/test.csv"]
+
+# Search-time settings swept for each approximate index type.
+SWEEPS = {
+    "flat": [{}],
+    "ivf-flat": [{"nprobe": p} for p in (1, 4, 16, 64)],
+    "ivf-pq": [{"nprobe": p} for p in (1, 4, 16, 64)],
+    "hnsw": [{"ef_search": ef} for ef in (16, 64, 256)],
+}
+
+# Benchmarks the FAISS index types against the exact flat index: recall@k of
+# each approximate index w.r.t. the flat top-k, single-query and batch search
+# latency, and serialized index size (a close proxy for resident memory).
+# The catalog is small today, so --size grows it to a target size by adding
+# noisy copies of the real catalog embeddings, which keeps its cluster shape.
+
+
+def base_vectors(size: int, noise: float, seed: int) -> np.ndarray:
+    if os.path.exists(EMBEDDINGS_PATH):
+        catalog = np.load(EMBEDDINGS_PATH)["embeddings"]
+    else:
+        # Indexes built before the embedding cache are flat with row ids.
+        index = faiss.read_index(snapshot_paths(current_dir(PROCESSED_DIR))["index"])
+        catalog = index.reconstruct_n(0, index.ntotal)
+    if size <= len(catalog):
+        return catalog
+
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(catalog), size - len(catalog))
+    extra = catalog[picks] + rng.normal(0, noise, (len(picks), catalog.shape[1])).astype("float32")
+    faiss.normalize_L2(extra)
+    return np.vstack([catalog, extra])
+
+
+def query_vectors(n_synthetic: int, base: np.ndarray, noise: float, seed: int) -> np.ndarray:
+    queries = []
+    for path in QUERY_CSVS:
+        queries.extend(pd.read_csv(path)["Query"].unique())
+    real = load_encoder().encode(list(dict.fromkeys(queries)))
+
+    # Perturbed catalog vectors stand in for the wider query distribution.
+    rng = np.random.default_rng(seed + 1)
+    picks = rng.integers(0, len(base), n_synthetic)
+    synthetic = base[picks] + rng.normal(0, noise, (n_synthetic, base.shape[1])).astype("float32")
+    faiss.normalize_L2(synthetic)
+    return np.vstack([real, synthetic]).astype("float32")
+
+
+def recall_at_k(ids: np.ndarray, truth: np.ndarray, k: int) -> float:
+    return float(np.mean([
+        len(set(a[:k]) & set(b[:k])) / k for a, b in zip(ids, truth)
+    ]))
+
+
+def time_search(index, queries: np.ndarray, k: int) -> Dict[str, float]:
+    index.search(queries[:1], k)
+
+    single = []
+    for row in range(len(queries)):
+        start = time.perf_counter()
+        index.search(queries[row:row + 1], k)
+        single.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    index.search(queries, k)
+    batch = time.perf_counter() - start
+
+    single_ms = np.array(single) * 1000
+    return {
+        "p50_ms": float(np.percentile(single_ms, 50)),
+        "p95_ms": float(np.percentile(single_ms, 95)),
+        "batch_qps": len(queries) / batch,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall, latency and memory of FAISS index types vs flat.")
+    parser.add_argument("--types", nargs="+", default=list(SWEEPS), choices=list(SWEEPS))
+    parser.add_argument("--size", type=int, default=0, help="Grow the catalog to this many vectors (default: real catalog)")
+    parser.add_argument("--queries", type=int, default=500, help="Synthetic queries added to the val/test queries")
+    parser.add_argument("--k", type=int, nargs="+", default=[10, 100], help="Cut-offs for recall@k")
+    parser.add_argument("--noise", type=float, default=0.05, help="Per-dimension noise for synthetic vectors")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    base = base_vectors(args.size, args.noise, args.seed)
+    queries = query_vectors(args.queries, base, args.noise, args.seed)
+    max_k = min(max(args.k), len(base))
+    ks = [k for k in args.k if k <= len(base)]
+    print(f"Catalog vectors: {len(base)} | queries: {len(queries)} | dim: {base.shape[1]}\n")
+
+    flat, _ = build_index(base, "flat")
+    _, truth = flat.search(queries, max_k)
+
+    rows: List[Dict] = []
+    for index_type in args.types:
+        start = time.perf_counter()
+        index, params = build_index(base, index_type)
+        build_s = time.perf_counter() - start
+        memory_mb = len(faiss.serialize_index(index)) / 1e6
+
+        for sweep in SWEEPS[index_type]:
+            search_params = dict(params, **sweep)
+            configure_search(index, index_type, search_params)
+            _, ids = index.search(queries, max_k)
+
+            row = {
+                "type": index_type,
+                "search": ", ".join(f"{k}={v}" for k, v in sweep.items()) or "-",
+                "build_s": round(build_s, 2),
+                "memory_mb": round(memory_mb, 2),
+            }
+            for k in ks:
+                row[f"recall@{k}"] = round(recall_at_k(ids, truth, k), 4)
+            row.update({key: round(value, 3) for key, value in time_search(index, queries, max_k).items()})
+            rows.append(row)
+
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
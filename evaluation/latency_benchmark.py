@@ -0,0 +1,265 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+import app
+from rag import retriever
+from rag.encoders import EMBEDDING_BACKEND
+from rag.utils import intent as intent_module
+from rag.utils.classifier import classify_intent
+from rag.utils.timing import record_stages, stage
+
+QUERY_CSVS = ["data/result/val.csv", "data/result/test.csv"]
+BENCHMARK_DIR = "data/benchmarks"
+
+STAGES = ["cache", "intent", "retrieve", "expand", "lexical", "dedup", "rerank", "serialize"]
+PERCENTILES = [50, 95, 99]
+
+# Replays the val/test queries through app.recommend in-process at several
+# concurrency levels and reports per-stage and end-to-end latency
+# percentiles plus throughput. Ollama is replaced by a deterministic stub
+# (the local classifier's intent after a fixed delay), so two runs on the
+# same machine differ only by the code under test. Results are saved as
+# JSON and can be diffed against an earlier run with --baseline.
+
+
+class StubChain:
+    # Stands in for prompt | ChatOllama | parser; see intent.set_chain.
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+        self.calls = 0
+
+    def _intent(self, query: str) -> Dict[str, Any]:
+        self.calls += 1
+        intent = classify_intent(query)[0]
+        intent["categories"] = sorted(intent["categories"])
+        return intent
+
+    def invoke(self, inputs: Dict[str, str]) -> Dict[str, Any]:
+        time.sleep(self.latency)
+        return self._intent(inputs["query"])
+
+    async def ainvoke(self, inputs: Dict[str, str]) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency)
+        return self._intent(inputs["query"])
+
+
+def load_queries() -> List[str]:
+    queries = []
+    for path in QUERY_CSVS:
+        queries.extend(pd.read_csv(path)["Query"].unique())
+    return list(dict.fromkeys(queries))
+
+
+async def timed_request(query: str, top_k: int) -> Dict[str, float]:
+    start = time.perf_counter()
+    with record_stages() as timings:
+        result = await app.recommend(app.QueryRequest(query=query, top_k=top_k))
+        # What FastAPI does with a returned dict before it hits the wire
+        # (cache hits are already rendered).
+        if not isinstance(result, Response):
+            with stage("serialize"):
+                JSONResponse(content=jsonable_encoder(result))
+    timings["total"] = time.perf_counter() - start
+    return timings
+
+
+async def run_level(queries: List[str], concurrency: int, repeat: int, top_k: int) -> Dict[str, Any]:
+    work = asyncio.Queue()
+    for _ in range(repeat):
+        for query in queries:
+            work.put_nowait(query)
+
+    samples: List[Dict[str, float]] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                query = work.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                samples.append(await timed_request(query, top_k))
+            except Exception as e:
+                errors += 1
+                print(f"Request failed for {query[:60]!r}: {e}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    stages = {}
+    for name in STAGES + ["total"]:
+        values = np.array([s.get(name, 0.0) for s in samples]) * 1000
+        if not len(values):
+            continue
+        stages[name] = {
+            f"p{p}_ms": round(float(v), 3)
+            for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))
+        }
+        stages[name]["mean_ms"] = round(float(values.mean()), 3)
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_qps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "stages": stages,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_level(level: Dict[str, Any]):
+    print(
+        f"== concurrency {level['concurrency']}: {level['requests']} requests in "
+        f"{level['elapsed_s']:.2f}s ({level['throughput_qps']:.1f} queries/s), "
+        f"{level['errors']} errors, {level['llm_calls']} LLM calls"
+    )
+    rows = [{"stage": name, **values} for name, values in level["stages"].items()]
+    print(pd.DataFrame(rows).to_string(index=False) + "\n")
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_regression: Optional[float]) -> bool:
+    # Prints p50/p95 per stage and throughput against the baseline; returns
+    # False if any total p95 or throughput regressed past max_regression.
+    print(f"== vs baseline {baseline['meta'].get('commit')} ({baseline['meta'].get('created')})")
+    for key in ("cpus", "encoder_backend", "index_type", "repeat", "top_k", "llm_ms", "response_cache"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"Note: {key} differs ({baseline['meta'].get(key)} -> {current['meta'].get(key)})")
+    ok = True
+    previous = {level["concurrency"]: level for level in baseline["levels"]}
+    rows = []
+    for level in current["levels"]:
+        before = previous.get(level["concurrency"])
+        if before is None:
+            continue
+        for name, values in level["stages"].items():
+            old = before["stages"].get(name)
+            if not old:
+                continue
+            row = {"concurrency": level["concurrency"], "stage": name}
+            for key in ("p50_ms", "p95_ms"):
+                change = values[key] / old[key] - 1 if old[key] else 0.0
+                row[key] = f"{old[key]:.2f} -> {values[key]:.2f} ({change:+.0%})"
+                if name == "total" and key == "p95_ms" and max_regression is not None and change > max_regression:
+                    ok = False
+            rows.append(row)
+
+        change = level["throughput_qps"] / before["throughput_qps"] - 1 if before["throughput_qps"] else 0.0
+        rows.append({
+            "concurrency": level["concurrency"],
+            "stage": "throughput",
+            "p50_ms": f"{before['throughput_qps']:.1f} -> {level['throughput_qps']:.1f} qps ({change:+.0%})",
+            "p95_ms": "",
+        })
+        if max_regression is not None and -change > max_regression:
+            ok = False
+
+    print(pd.DataFrame(rows).to_string(index=False))
+    return ok
+
+
+async def run(args) -> Dict[str, Any]:
+    stub = StubChain(args.llm_ms)
+    intent_module.set_chain(stub)
+    app.warm_up()
+
+    queries = load_queries()
+    print(f"{len(queries)} queries x {args.repeat} | top_k {args.top_k} | stub LLM {args.llm_ms:g} ms\n")
+
+    # One untimed pass pays for lazy imports and first-call allocations.
+    for query in queries:
+        await timed_request(query, args.top_k)
+
+    levels = []
+    for concurrency in args.concurrency:
+        # Every level starts cold, so they all make the same LLM calls.
+        intent_module.clear_intent_cache()
+        if app.response_cache is not None:
+            app.response_cache.clear()
+        calls = stub.calls
+        level = await run_level(queries, concurrency, args.repeat, args.top_k)
+        level["llm_calls"] = stub.calls - calls
+        print_level(level)
+        levels.append(level)
+
+    snapshot = retriever.get_snapshot()
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "encoder_backend": EMBEDDING_BACKEND,
+            "index_type": snapshot.info["type"],
+            "index_version": snapshot.version,
+            "queries": len(queries),
+            "repeat": args.repeat,
+            "top_k": args.top_k,
+            "llm_ms": args.llm_ms,
+            "fast_path_threshold": intent_module.INTENT_FAST_PATH_THRESHOLD,
+            "llm_deadline": intent_module.INTENT_LLM_DEADLINE,
+            "response_cache": app.response_cache is not None,
+        },
+        "levels": levels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end /recommend latency with a stubbed LLM.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the query set per level")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--llm-ms", type=float, default=50, help="Simulated Ollama latency per call")
+    parser.add_argument("--output", help="Where to save this run's results (default: data/benchmarks/latency-<commit>.json)")
+    parser.add_argument("--baseline", help="Earlier results to diff against")
+    parser.add_argument("--max-regression", type=float,
+                        help="Fail if total p95 or throughput is this fraction worse than the baseline")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = asyncio.run(run(args))
+
+    output = args.output or os.path.join(
+        BENCHMARK_DIR, f"latency-{results['meta']['commit'] or time.strftime('%Y%m%dT%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved results to {output}")
+
+    if baseline and not compare(results, baseline, args.max_regression):
+        print("Latency regression beyond --max-regression")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
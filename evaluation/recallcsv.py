@@ -1,3 +1,5 @@
+from typing import Dict, List, Set
+
 import pandas as pd
 
 GROUND_TRUTH_CSV = "data/result/val.csv"
@@ -11,61 +13,72 @@ def normalize_url(url: str) -> str:
     url = str(url).strip().lower().rstrip("/")
     return url.split("/")[-1]
 
-gt_df = pd.read_csv(GROUND_TRUTH_CSV)
-pred_df = pd.read_csv(PREDICTIONS_CSV)
-
-print(f"Ground truth rows: {len(gt_df)}")
-print(f"Prediction rows: {len(pred_df)}\n")
+def load_ground_truth(df: pd.DataFrame) -> Dict[str, Set[str]]:
+    gt_map = {}
+    for _, row in df.iterrows():
+        q = row["Query"]
+        slug = normalize_url(row["Assessment_url"])
 
-gt_map = {}
-for _, row in gt_df.iterrows():
-    q = row["Query"]
-    slug = normalize_url(row["Assessment_url"])
+        if not slug:
+            continue
 
-    if not slug:
-        continue
+        if q not in gt_map:
+            gt_map[q] = set()
 
-    if q not in gt_map:
-        gt_map[q] = set()
+        gt_map[q].add(slug)
+    return gt_map
 
-    gt_map[q].add(slug)
+def load_predictions(df: pd.DataFrame) -> Dict[str, List[str]]:
+    pred_map = {}
+    for _, row in df.iterrows():
+        q = row["Query"]
+        slug = normalize_url(row["Assessment_url"])
 
-pred_map = {}
-for _, row in pred_df.iterrows():
-    q = row["Query"]
-    slug = normalize_url(row["Assessment_url"])
+        if not slug:
+            continue
 
-    if not slug:
-        continue
+        if q not in pred_map:
+            pred_map[q] = []
 
-    if q not in pred_map:
-        pred_map[q] = []
-
-    pred_map[q].append(slug)
+        pred_map[q].append(slug)
+    return pred_map
 
 def recall_at_k(predicted_slugs, relevant_slugs, k):
     if not relevant_slugs:
         return 0.0
     return len(set(predicted_slugs[:k]) & relevant_slugs) / len(relevant_slugs)
 
-recalls = []
+def main():
+    gt_df = pd.read_csv(GROUND_TRUTH_CSV)
+    pred_df = pd.read_csv(PREDICTIONS_CSV)
+
+    print(f"Ground truth rows: {len(gt_df)}")
+    print(f"Prediction rows: {len(pred_df)}\n")
+
+    gt_map = load_ground_truth(gt_df)
+    pred_map = load_predictions(pred_df)
+
+    recalls = []
+
+    for query, relevant_slugs in gt_map.items():
+        predicted_slugs = pred_map.get(query, [])
 
-for query, relevant_slugs in gt_map.items():
-    predicted_slugs = pred_map.get(query, [])
+        recall = recall_at_k(predicted_slugs, relevant_slugs, K)
+        recalls.append(recall)
 
-    recall = recall_at_k(predicted_slugs, relevant_slugs, K)
-    recalls.append(recall)
+        print(
+            f"Recall@{K}: {recall:.3f} | "
+            f"Relevant: {len(relevant_slugs):2d} | "
+            f"Predicted: {len(predicted_slugs):2d} | "
+            f"{query[:80]}..."
+        )
 
-    print(
-        f"Recall@{K}: {recall:.3f} | "
-        f"Relevant: {len(relevant_slugs):2d} | "
-        f"Predicted: {len(predicted_slugs):2d} | "
-        f"{query[:80]}..."
-    )
 
+    mean_recall = sum(recalls) / len(recalls) if recalls else 0.0
 
-mean_recall = sum(recalls) / len(recalls) if recalls else 0.0
+    print("\n" + "=" * 80)
+    print(f"Mean Recall@{K}: {mean_recall:.4f}")
+    print(f"Evaluated on {len(recalls)} unique queries")
 
-print("\n" + "=" * 80)
-print(f"Mean Recall@{K}: {mean_recall:.4f}")
-print(f"Evaluated on {len(recalls)} unique queries")
+if __name__ == "__main__":
+    main()
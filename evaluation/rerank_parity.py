@@ -0,0 +1,224 @@
+import itertools
+import json
+import random
+import sys
+from typing import List, Dict
+
+import pandas as pd
+
+from rag.snapshots import current_dir, snapshot_paths
+from rag.store import CatalogStore
+from rag.utils.classifier import classify_intent
+from rag.utils.features import CatalogFeatures
+from rag.utils.keywords import normalize_keywords
+from rag.utils.lexical import LexicalIndex
+from rag.utils.rerank import rerank
+
+PROCESSED_DIR = "data/processed"
+QUERY_CSVS = ["data/result/val.csv", "data/result/test.csv"]
+CATEGORIES = ["tech", "sales", "admin", "leadership", "marketing", "general", "finance", "hr", "operations"]
+DURATIONS = [None, 20, 40, 60]
+TOP_KS = [5, 10, 50]
+
+# Reference implementation: the loop-based scorer rerank used before the
+# feature matrix. The vectorized rerank must reproduce its ordering exactly.
+
+def legacy_rerank(results: List[Dict], query: str, intent: Dict, top_k: int = 5) -> List[Dict]:
+    q = query.lower()
+    
+    search_keywords = normalize_keywords(intent["explicit_keywords"])
+    
+    if "java script" in q or "javascript" in q:
+        if "javascript" not in [k.lower() for k in search_keywords]:
+            search_keywords.append("javascript")
+    elif "java" in q:
+        if "javascript" not in q and "java script" not in q:
+            if "java" not in [k.lower() for k in search_keywords]:
+                search_keywords.append("java")
+    
+    other_langs = ["python", "sql", "c++", "c#", ".net", "react", "node.js", "js"]
+    for lang in other_langs:
+        if lang in q and lang not in [k.lower() for k in search_keywords]:
+            search_keywords.append(lang)
+    
+    search_keywords = normalize_keywords(search_keywords)
+    
+    scored = []
+
+    for item in results:
+        score = 0.0
+        name = item.get("name", "").lower()
+        desc = item.get("description", "").lower()
+        test_types = item.get("test_type", [])
+        
+        for kw in search_keywords:
+            kw_lower = kw.lower()
+            
+            if kw_lower in ["javascript", "js"]:
+                if "javascript" in name:
+                    score += 30.0
+                elif "javascript" in desc:
+                    score += 10.0
+            elif kw_lower == "java":
+                if "javascript" not in name and "java" in name:
+                    score += 30.0
+                elif "javascript" not in desc and "java" in desc:
+                    score += 10.0
+            else:
+                if kw_lower in name:
+                    score += 30.0
+                elif kw_lower in desc:
+                    score += 10.0
+
+        if "tech" in intent["categories"]:
+            if "K" in test_types: score += 5.0
+            if "S" in test_types and ("coding" in name or "automata" in name): score += 15.0
+            if any(x in name for x in ["development", "engineering", "programming"]): score += 5.0
+
+        if "sales" in intent["categories"]:
+            if "sales" in name: score += 20.0
+            if "negotiation" in name or "commercial" in name: score += 10.0
+
+        if "leadership" in intent["categories"]:
+            if any(x in name for x in ["manager", "leader", "executive", "strategic"]): score += 15.0
+            if "opq" in name or "leadership" in name: score += 15.0
+
+        if "admin" in intent["categories"]:
+            if any(x in name for x in ["admin", "clerical", "typing", "data entry", "office", "outlook", "word"]): score += 20.0
+
+        if "marketing" in intent["categories"]:
+            if any(x in name for x in ["marketing", "brand", "advertising", "seo", "digital"]): score += 20.0
+
+        if "finance" in intent["categories"] or "accounting" in q:
+            if any(x in name for x in ["accounting", "financial", "payable", "receivable", "money"]): score += 20.0
+
+        if "hr" in intent["categories"]:
+            if "human resources" in name or "training" in name: score += 20.0
+
+        if "general" in intent["categories"] or any(x in q for x in ["aptitude", "reasoning", "cognitive", "ability"]):
+            if "verify" in name or "reasoning" in name or "calculation" in name or "comprehension" in name:
+                score += 25.0
+            if "A" in test_types: score += 10.0
+
+        if intent["behavioral"]:
+            if "P" in test_types or "B" in test_types or "C" in test_types: score += 15.0
+            if any(x in name for x in ["communication", "team", "interpersonal", "motivation", "personality"]): score += 15.0
+
+        if intent["is_entry_level"]:
+            if any(x in name for x in ["graduate", "entry level", "screen", "fundamental", "basic"]):
+                score += 15.0
+
+        if intent["duration_max"]:
+            dur = item.get("duration")
+            if dur:
+                if dur <= intent["duration_max"]: score += 10.0
+                elif dur <= intent["duration_max"] + 15: score += 0.0
+                else: score -= 15.0
+
+        if "tech" in intent["categories"] and not {"admin", "sales"}.intersection(intent["categories"]):
+            if "customer service" in name or "call center" in name:
+                score -= 20.0
+
+        scored.append((score, item))
+
+    scored.sort(key=lambda x: x[0], reverse=True)
+    
+    final_results = []
+    
+    if intent["categories"] and intent["behavioral"]:
+        hard_bucket = []
+        soft_bucket = []
+        others = []
+
+        for _, item in scored:
+            t_types = item.get("test_type", [])
+            name_lower = item.get("name", "").lower()
+            
+            is_soft = "P" in t_types or "B" in t_types or "C" in t_types or "communication" in name_lower
+            is_hard = "K" in t_types or "S" in t_types or "A" in t_types
+            
+            if is_soft:
+                soft_bucket.append(item)
+            elif is_hard:
+                hard_bucket.append(item)
+            else:
+                others.append(item)
+        
+        while len(final_results) < top_k:
+            if hard_bucket: final_results.append(hard_bucket.pop(0))
+            if len(final_results) >= top_k: break
+            
+            if soft_bucket: final_results.append(soft_bucket.pop(0))
+            if len(final_results) >= top_k: break
+            
+            if not hard_bucket and not soft_bucket:
+                if others: final_results.append(others.pop(0))
+                else: break
+    else:
+        final_results = [item for _, item in scored[:top_k]]
+
+    return final_results
+
+
+def intent_grid(explicit_keywords: List[str]):
+    category_sets = [set()] + [{c} for c in CATEGORIES] + [set(pair) for pair in itertools.combinations(CATEGORIES, 2)]
+    for categories in category_sets:
+        for behavioral, is_entry_level in itertools.product([False, True], repeat=2):
+            for duration_max in DURATIONS:
+                yield {
+                    "categories": set(categories),
+                    "explicit_keywords": list(explicit_keywords),
+                    "behavioral": behavioral,
+                    "duration_max": duration_max,
+                    "is_entry_level": is_entry_level,
+                }
+
+
+def main():
+    paths = snapshot_paths(current_dir(PROCESSED_DIR))
+    with open(paths["meta"], "r", encoding="utf-8") as f:
+        catalog = json.load(f)
+
+    queries = []
+    for path in QUERY_CSVS:
+        queries.extend(pd.read_csv(path)["Query"].unique())
+    queries.extend(["java script developer", "c# and .net", "accounting clerk", "aptitude and reasoning"])
+
+    # The table indexing.py stored with the snapshot, as the API loads it.
+    lexical = LexicalIndex.build(catalog)
+    features = None
+    if CatalogFeatures.is_current(paths["features"]):
+        features = CatalogFeatures.load(paths["features"], CatalogStore.load(paths["store"]), lexical=lexical)
+    if features is None:
+        print("No current rerank feature table in the snapshot, computing it from the catalog")
+        features = CatalogFeatures.build(catalog, lexical=lexical)
+    rng = random.Random(0)
+
+    checked = 0
+    mismatches = 0
+    for query in queries:
+        keywords = classify_intent(query)[0]["explicit_keywords"]
+
+        # Candidate pools: a random slice of the catalog in random order,
+        # as the retriever would hand them to rerank.
+        rows = rng.sample(range(len(catalog)), 150)
+        candidates = [catalog[row] for row in rows]
+
+        for intent in intent_grid(keywords):
+            for top_k in TOP_KS:
+                expected = [item["url"] for item in legacy_rerank(candidates, query, intent, top_k)]
+                actual = [catalog[row]["url"] for row in rerank(rows, query, top_k, intent=intent, features=features)]
+                checked += 1
+                if expected != actual:
+                    mismatches += 1
+                    if mismatches <= 5:
+                        print(f"Mismatch: {query[:60]}... intent={intent} top_k={top_k}")
+
+    print(f"Checked {checked} (query, intent, top_k) combinations")
+    print(f"Mismatches: {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,18 @@
+import argparse
 import json
+import random
+import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+
+import lxml.html
 import requests
-import re
-from bs4 import BeautifulSoup
+from lxml import etree
+from requests.adapters import HTTPAdapter
+
+from pipeline.http_cache import HTTP_CACHE_DIR, HttpCache, cached_get
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (SHL-Catalog-Builder)"
@@ -10,27 +20,120 @@ HEADERS = {
 
 INPUT_FILE = "data/raw/catalog_metadata.json"
 OUTPUT_FILE = "data/processed/catalog.json"
-REQUEST_DELAY = 1
+CHANGES_FILE = "data/processed/catalog_changes.json"
 TIMEOUT = 30
 
+# Politeness: product pages are fetched by WORKERS threads that share one
+# keep-alive connection pool, but never faster than REQUEST_RATE per second
+# on average (bursts of up to REQUEST_BURST).
+WORKERS = 8
+REQUEST_RATE = 2.0
+REQUEST_BURST = 2
+
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+DURATION_RE = re.compile(
+    r"Approximate Completion Time in minutes\s*=\s*(\d+)",
+    re.IGNORECASE
+)
+
+# BeautifulSoup's get_text() skips these; drop them so the text matches.
+NON_TEXT_TAGS = ("script", "style", "template")
+
+# Bump when parse_product_page changes so cached parser output is redone.
+PARSER_VERSION = 1
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def make_session(pool_size: int = WORKERS) -> requests.Session:
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def backoff_delay(attempt: int, retry_after=None) -> float:
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX, float(retry_after))
+        except ValueError:
+            pass
+    # Full jitter keeps retrying workers from hitting the server in lockstep.
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def fetch(session, bucket, url, headers=None):
+    for attempt in range(MAX_RETRIES + 1):
+        bucket.acquire()
+        try:
+            r = session.get(url, headers=headers, timeout=TIMEOUT)
+            if r.status_code not in RETRY_STATUSES:
+                r.raise_for_status()
+                return r
+            error = requests.HTTPError(f"{r.status_code} for {url}", response=r)
+            retry_after = r.headers.get("Retry-After")
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            error, retry_after = e, None
+
+        if attempt == MAX_RETRIES:
+            raise error
+        wait = backoff_delay(attempt, retry_after)
+        print(f"[WARN] {error} → retrying in {wait:.1f}s")
+        time.sleep(wait)
 
-def des_dura(url):
-    r = requests.get(url, headers=HEADERS, timeout=TIMEOUT)
-    r.raise_for_status()
 
-    soup = BeautifulSoup(r.text, "lxml")
+def _text(element, sep=""):
+    return sep.join(t.strip() for t in element.itertext() if t.strip())
+
+
+def parse_product_page(html):
+    # One lxml parse; same selection and text rules as the previous
+    # BeautifulSoup version (container class lookup, stripped text).
+    try:
+        doc = lxml.html.fromstring(html.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8"))
+    except etree.ParserError:
+        return "", None
+    etree.strip_elements(doc, *NON_TEXT_TAGS, with_tail=False)
 
     container = None
     for cls in ["product-detail", "product-content", "product-main"]:
-        container = soup.find("div", class_=cls)
-        if container:
+        found = doc.xpath(
+            f'//div[contains(concat(" ", normalize-space(@class), " "), " {cls} ")]'
+        )
+        if found:
+            container = found[0]
             break
-    if not container:
-        container = soup
+    if container is None:
+        container = doc
 
     description = ""
-    for p in container.find_all("p"):
-        text = p.get_text(strip=True)
+    for p in container.iter("p"):
+        text = _text(p)
         if (
             len(text) > 80
             and "cookie" not in text.lower()
@@ -40,13 +143,9 @@ def des_dura(url):
             break
 
     duration = None
-    full_text = container.get_text(" ", strip=True)
+    full_text = _text(container, " ")
 
-    match = re.search(
-        r"Approximate Completion Time in minutes\s*=\s*(\d+)",
-        full_text,
-        re.IGNORECASE
-    )
+    match = DURATION_RE.search(full_text)
 
     if match:
         duration = int(match.group(1))
@@ -54,23 +153,77 @@ def des_dura(url):
     return description, duration
 
 
-def cata_build():
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
+def des_dura(url, session=None, bucket=None):
+    session = session or make_session(1)
+    bucket = bucket or TokenBucket(REQUEST_RATE, REQUEST_BURST)
+    r = fetch(session, bucket, url)
+    return parse_product_page(r.text)
+
+
+def enrich_page(url, session, bucket, cache=None):
+    # Returns (description, duration, changed). Pages the server reports as
+    # not modified, or that come back byte-identical, reuse the stored
+    # parser output; `changed` is True only if the parsed fields differ.
+    page = cached_get(cache, url, lambda headers: fetch(session, bucket, url, headers))
+
+    parsed = page.parsed(PARSER_VERSION)
+    if parsed is not None:
+        return parsed[0], parsed[1], False
+
+    description, duration = parse_product_page(page.text)
+    previous = page.stored_parsed(PARSER_VERSION)
+    if cache is not None:
+        cache.store_parsed(page, [description, duration], PARSER_VERSION)
+    return description, duration, previous != [description, duration]
+
+
+def fetch_url(url, origin=None):
+    # --origin points fetches at a local stand-in serving saved pages while
+    # the catalog keeps the real URLs.
+    if not origin:
+        return url
+    parts, base = urlsplit(url), urlsplit(origin)
+    return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, parts.fragment))
+
+
+def cata_build(
+    input_file=INPUT_FILE,
+    output_file=OUTPUT_FILE,
+    workers=WORKERS,
+    rate=REQUEST_RATE,
+    burst=REQUEST_BURST,
+    origin=None,
+    cache_dir=HTTP_CACHE_DIR,
+    changes_file=CHANGES_FILE,
+):
+    with open(input_file, "r", encoding="utf-8") as f:
         base_items = json.load(f)
 
     total = len(base_items)
+    session = make_session(workers)
+    bucket = TokenBucket(rate, burst)
+    cache = HttpCache(cache_dir) if cache_dir else None
 
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as out:
-        out.write("[\n")
+    def enrich(item):
+        try:
+            return enrich_page(fetch_url(item["url"], origin), session, bucket, cache)
+        except Exception as e:
+            print(f"Error: {item['url']}: {e}")
+            return "", None, True
 
-        for idx, item in enumerate(base_items, start=1):
-            print(f"[{idx}/{total}] Fetching → {item['name']}")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor, \
+            open(output_file, "w", encoding="utf-8") as out:
+        futures = [executor.submit(enrich, item) for item in base_items]
+        out.write("[\n")
 
-            try:
-                description, duration = des_dura(item["url"])
-            except Exception as e:
-                print(f"Error: {e}")
-                description, duration = "", None
+        changed = []
+        # Pages finish in any order; records are written in input order.
+        for idx, (item, future) in enumerate(zip(base_items, futures), start=1):
+            description, duration, page_changed = future.result()
+            if page_changed:
+                changed.append(item["url"])
+            print(f"[{idx}/{total}] Fetched → {item['name']}")
 
             record = {
                 "url": item["url"],
@@ -87,15 +240,42 @@ def cata_build():
             else:
                 out.write("\n")
 
-            out.flush()   
-            time.sleep(REQUEST_DELAY)
+            out.flush()
 
         out.write("]\n")
 
-    print(f"\nCatalog built successfully: {total} items")
-    print(f"Output saved at: {OUTPUT_FILE}")
+    session.close()
+    elapsed = time.perf_counter() - start
 
+    # The pages whose parsed fields changed; `python -m rag.indexing` then
+    # re-encodes only the matching items (it diffs by content hash).
+    if changes_file:
+        with open(changes_file, "w", encoding="utf-8") as f:
+            json.dump({"total": total, "changed": changed}, f, indent=2)
+
+    print(f"\nCatalog built successfully: {total} items in {elapsed:.1f}s")
+    if cache is not None:
+        print(f"HTTP cache: {cache.summary()}")
+    print(f"Changed items: {len(changed)}")
+    print(f"Output saved at: {output_file}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Enrich catalog metadata with product page details.")
+    parser.add_argument("--input", default=INPUT_FILE)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Concurrent page fetches")
+    parser.add_argument("--rate", type=float, default=REQUEST_RATE, help="Average requests per second")
+    parser.add_argument("--burst", type=int, default=REQUEST_BURST, help="Requests allowed back to back")
+    parser.add_argument("--origin", help="Fetch pages from this origin instead (e.g. a local stand-in)")
+    parser.add_argument("--cache-dir", default=HTTP_CACHE_DIR, help="Conditional-request page cache ('' to disable)")
+    parser.add_argument("--changes", default=CHANGES_FILE, help="Where to write the list of changed items")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    cata_build()
+    args = parse_args()
+    cata_build(
+        args.input, args.output, args.workers, args.rate, args.burst, args.origin,
+        args.cache_dir, args.changes
+    )
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import requests
+
+from rag.utils.atomic import atomic_path
+
+# On-disk cache of fetched pages for the scraper and the enrichment step.
+# Each entry keeps the page body with its ETag / Last-Modified validators,
+# so a re-crawl sends conditional requests and an unchanged page comes back
+# as an empty 304. Entries can also carry the parser output for the body,
+# so unchanged pages are not parsed again either.
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", "data/raw/http_cache")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def cache_key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    # Same URL encoding requests uses, with params in a fixed order.
+    prepared = requests.Request("GET", url, params=sorted((params or {}).items())).prepare()
+    return hashlib.sha256(prepared.url.encode("utf-8")).hexdigest()
+
+
+class Page:
+    def __init__(self, key: str, url: str, text: str, changed: bool, not_modified: bool, entry: Dict):
+        self.key = key
+        self.url = url
+        self.text = text
+        # changed: the body differs from the cached copy (or nothing was cached).
+        self.changed = changed
+        # not_modified: the server answered 304 and the cached body was used.
+        self.not_modified = not_modified
+        self.entry = entry
+
+    def stored_parsed(self, version: int):
+        # Parser output last stored for this URL by the same parser version.
+        stored = self.entry.get("parsed")
+        if not stored or stored.get("version") != version:
+            return None
+        return stored["value"]
+
+    def parsed(self, version: int):
+        # Stored parser output, but only if it was made from this exact body.
+        return None if self.changed else self.stored_parsed(version)
+
+
+class HttpCache:
+    def __init__(self, directory: str = HTTP_CACHE_DIR):
+        self.directory = directory
+        self.not_modified = 0
+        self.changed = 0
+        self.unchanged = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def load(self, key: str) -> Optional[Dict]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save(self, key: str, entry: Dict):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_path(path) as tmp:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+
+    def fetch(
+        self,
+        url: str,
+        get: Callable[[Dict[str, str]], requests.Response],
+        params: Optional[Dict[str, Any]] = None,
+    ) -> Page:
+        # `get(headers)` performs the request with the caller's own retry
+        # and rate-limit policy; this only adds the conditional headers.
+        key = cache_key(url, params)
+        entry = self.load(key)
+
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        r = get(headers)
+        if r.status_code == 304 and entry:
+            with self._lock:
+                self.not_modified += 1
+            return Page(key, url, entry["text"], False, True, entry)
+
+        text = r.text
+        digest = content_hash(text)
+        # Servers without validators still answer 200; an identical body
+        # counts as unchanged so its parsed output is reused.
+        changed = entry is None or entry.get("content_hash") != digest
+        new_entry = {
+            "url": url,
+            "params": params or {},
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "content_hash": digest,
+            "fetched_at": time.time(),
+            "text": text,
+        }
+        if entry and entry.get("parsed"):
+            new_entry["parsed"] = entry["parsed"]
+
+        with self._lock:
+            if changed:
+                self.changed += 1
+            else:
+                self.unchanged += 1
+        self.save(key, new_entry)
+        return Page(key, url, text, changed, False, new_entry)
+
+    def store_parsed(self, page: Page, value: Any, version: int):
+        page.entry["parsed"] = {"version": version, "value": value}
+        self.save(page.key, page.entry)
+
+    def summary(self) -> str:
+        return f"{self.not_modified} not modified, {self.unchanged} unchanged, {self.changed} new or changed"
+
+
+def cached_get(
+    cache: Optional[HttpCache],
+    url: str,
+    get: Callable[[Dict[str, str]], requests.Response],
+    params: Optional[Dict[str, Any]] = None,
+) -> Page:
+    # Without a cache every fetch is a plain, always-changed page.
+    if cache is None:
+        r = get({})
+        return Page(cache_key(url, params), url, r.text, True, False, {})
+    return cache.fetch(url, get, params)
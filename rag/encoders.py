@@ -0,0 +1,165 @@
+import argparse
+import os
+from typing import List
+
+import numpy as np
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# all-MiniLM-L6-v2 was trained on 256-token inputs; SentenceTransformer
+# truncates there as well, so the ONNX backends do the same.
+MAX_SEQ_LENGTH = 256
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BASE_DIR)
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_MODEL_DIR = os.getenv(
+    "EMBEDDING_MODEL_DIR",
+    os.path.join(PROJECT_ROOT, "data", "models", "all-MiniLM-L6-v2")
+)
+# 0 keeps the ONNX Runtime default (one thread per core).
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+
+ONNX_FILES = {
+    "onnx": "model.onnx",
+    "onnx-int8": "model.int8.onnx",
+}
+BACKENDS = ["torch"] + list(ONNX_FILES)
+
+
+class TorchEncoder:
+    def __init__(self, model_name: str = MODEL_NAME):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        print(f"Loading embedding model on {device}...")
+        self.model = SentenceTransformer(model_name, device=device)
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        ).astype("float32")
+
+
+class OnnxEncoder:
+    # Same model exported to ONNX (see export_onnx); mean pooling and L2
+    # normalization are done here, matching the SentenceTransformer pipeline.
+
+    def __init__(self, model_dir: str = EMBEDDING_MODEL_DIR, backend: str = "onnx"):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = os.path.join(model_dir, ONNX_FILES[backend])
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"ONNX model not found at {path}. "
+                "Please run 'python -m rag.encoders' first."
+            )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if EMBEDDING_THREADS:
+            options.intra_op_num_threads = EMBEDDING_THREADS
+
+        print(f"Loading {backend} embedding model from {path}...")
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            tokens = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=MAX_SEQ_LENGTH,
+                return_tensors="np"
+            )
+            feeds = {name: tokens[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            batches.append(pooled / np.clip(norms, 1e-12, None))
+
+        if not batches:
+            return np.empty((0, 0), dtype="float32")
+        return np.vstack(batches).astype("float32")
+
+
+def load_encoder(backend: str = None, model_dir: str = None):
+    backend = backend or EMBEDDING_BACKEND
+    if backend == "torch":
+        return TorchEncoder()
+    if backend in ONNX_FILES:
+        return OnnxEncoder(model_dir or EMBEDDING_MODEL_DIR, backend)
+    raise ValueError(
+        f"Unknown embedding backend '{backend}'. Expected one of: {', '.join(BACKENDS)}"
+    )
+
+
+def export_onnx(model_dir: str = EMBEDDING_MODEL_DIR, model_name: str = MODEL_NAME):
+    # Writes the tokenizer, an fp32 ONNX graph of the transformer and an int8
+    # copy with dynamically quantized weights (activations stay fp32).
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(model_dir, exist_ok=True)
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    tokenizer.save_pretrained(model_dir)
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                token_type_ids=token_type_ids
+            )[0]
+
+    sample = tokenizer(["Java developer with stakeholder skills"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    fp32_path = os.path.join(model_dir, ONNX_FILES["onnx"])
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(transformer),
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+    print(f"Exported {model_name} to {fp32_path}")
+
+    int8_path = os.path.join(model_dir, ONNX_FILES["onnx-int8"])
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"Quantized int8 model written to {int8_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the query encoder to ONNX (fp32 and int8).")
+    parser.add_argument("--output", default=EMBEDDING_MODEL_DIR, help="Directory for the exported model")
+    args = parser.parse_args()
+    export_onnx(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import json
+import math
+import os
+from typing import Any, Dict, Optional
+
+import faiss
+import numpy as np
+
+# FAISS index types the indexer can build. Embeddings are L2-normalized, so
+# every type searches by inner product (= cosine similarity).
+INDEX_TYPES = ["flat", "ivf-flat", "ivf-pq", "hnsw"]
+
+DEFAULT_PARAMS = {
+    "flat": {},
+    # nlist=None picks ~4*sqrt(n) lists, capped so each has ~39 training points.
+    "ivf-flat": {"nlist": None, "nprobe": 16},
+    "ivf-pq": {"nlist": None, "nprobe": 16, "pq_m": 48, "pq_nbits": 8},
+    "hnsw": {"hnsw_m": 32, "ef_construction": 200, "ef_search": 64},
+}
+
+# Only flat codes can be searched straight from a memory map; IVF inverted
+# lists would need an on-disk layout, so those indexes are read into memory.
+MMAP_TYPES = {"flat", "hnsw"}
+
+# Types whose vectors can be deleted in place; HNSW graphs cannot drop
+# nodes, so incremental updates rebuild them from the cached embeddings.
+REMOVABLE_TYPES = {"flat", "ivf-flat", "ivf-pq"}
+
+# FAISS warns (and clusters poorly) below ~39 training points per centroid.
+MIN_POINTS_PER_CENTROID = 39
+
+
+def resolve_params(index_type: str, n: int, dim: int, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    if index_type not in DEFAULT_PARAMS:
+        raise ValueError(
+            f"Unknown index type '{index_type}'. Expected one of: {', '.join(INDEX_TYPES)}"
+        )
+
+    params = dict(DEFAULT_PARAMS[index_type])
+    params.update({k: v for k, v in (overrides or {}).items() if k in params and v is not None})
+
+    if "nlist" in params:
+        if params["nlist"] is None:
+            params["nlist"] = int(4 * math.sqrt(n))
+        params["nlist"] = max(1, min(params["nlist"], n // MIN_POINTS_PER_CENTROID))
+        params["nprobe"] = min(params["nprobe"], params["nlist"])
+
+    if index_type == "ivf-pq":
+        if dim % params["pq_m"]:
+            raise ValueError(f"pq_m={params['pq_m']} must divide the embedding dimension {dim}")
+        # Each sub-quantizer trains 2**nbits centroids on the same n points,
+        # so small catalogs get fewer bits, like nlist above.
+        max_nbits = int(math.log2(max(n // MIN_POINTS_PER_CENTROID, 2)))
+        params["pq_nbits"] = max(1, min(params["pq_nbits"], max_nbits))
+
+    return params
+
+
+def build_index(
+    embeddings: np.ndarray,
+    index_type: str = "flat",
+    params: Optional[Dict[str, Any]] = None,
+    ids: Optional[np.ndarray] = None,
+):
+    # With `ids`, search returns those ids instead of insertion positions.
+    # IVF indexes store ids natively; flat and HNSW get an IndexIDMap2.
+    n, dim = embeddings.shape
+    params = resolve_params(index_type, n, dim, params)
+
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["hnsw_m"], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = params["ef_construction"]
+    else:
+        quantizer = faiss.IndexFlatIP(dim)
+        if index_type == "ivf-flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, params["nlist"], faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(
+                quantizer, dim, params["nlist"], params["pq_m"], params["pq_nbits"],
+                faiss.METRIC_INNER_PRODUCT
+            )
+        index.train(embeddings)
+
+    if ids is None:
+        index.add(embeddings)
+    else:
+        if index_type in ("flat", "hnsw"):
+            index = faiss.IndexIDMap2(index)
+        index.add_with_ids(embeddings, np.asarray(ids, dtype=np.int64))
+
+    configure_search(index, index_type, params)
+    return index, params
+
+
+def configure_search(index, index_type: str, params: Dict[str, Any]):
+    # Search-time knobs are not all serialized with the index (nprobe is,
+    # efSearch is not), so they are applied from the metadata on every load.
+    if index_type in ("ivf-flat", "ivf-pq"):
+        faiss.extract_index_ivf(index).nprobe = int(params["nprobe"])
+    elif index_type == "hnsw":
+        if isinstance(index, faiss.IndexIDMap):
+            index = faiss.downcast_index(index.index)
+        index.hnsw.efSearch = int(params["ef_search"])
+
+
+def index_info(index, index_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": index_type,
+        "metric": "inner_product",
+        "dim": index.d,
+        "ntotal": int(index.ntotal),
+        "params": params,
+    }
+
+
+def write_index_info(path: str, info: Dict[str, Any]):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+
+
+def read_index_info(path: str) -> Dict[str, Any]:
+    # Indexes built before index types existed are flat and have no file.
+    if not os.path.exists(path):
+        return {"type": "flat", "params": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -1,19 +1,48 @@
+import argparse
+import hashlib
 import json
+import os
+import time
+from collections import Counter
 import numpy as np
 import faiss
 import torch
 from sentence_transformers import SentenceTransformer
 
+from rag.encoders import MODEL_NAME
+from rag.index_types import (
+    INDEX_TYPES,
+    REMOVABLE_TYPES,
+    build_index,
+    configure_search,
+    index_info,
+    read_index_info,
+    write_index_info,
+)
+from rag.snapshots import current_dir, new_version, prune, publish, snapshot_paths, snapshots_dir
+from rag.store import CatalogStore
+from rag.utils.atomic import atomic_dir, atomic_path
+from rag.utils.features import CatalogFeatures
+from rag.utils.lexical import LexicalIndex
+
 CATALOG_PATH = "data/processed/catalog.json"
-INDEX_PATH = "data/processed/faiss.index"
-META_PATH = "data/processed/faiss_meta.json"
+PROCESSED_DIR = "data/processed"
+EMBEDDINGS_PATH = "data/processed/embeddings.npz"
+KEEP_SNAPSHOTS = int(os.getenv("INDEX_KEEP_SNAPSHOTS", "3"))
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
+BUILD_PARAMS = ("nlist", "pq_m", "pq_nbits", "hnsw_m", "ef_construction")
+SEARCH_PARAMS = ("nprobe", "ef_search")
 
-model = SentenceTransformer(
-    "sentence-transformers/all-MiniLM-L6-v2",
-    device=device
-)
+model = None
+
+def get_model():
+    # Loaded on first use: a refresh with no new or changed items never
+    # needs the model at all.
+    global model
+    if model is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        model = SentenceTransformer(MODEL_NAME, device=device)
+    return model
 
 def build_embedding_text(item):
     types_str = ", ".join(item.get("test_type", []))
@@ -26,7 +55,83 @@ def build_embedding_text(item):
         f"Adaptive: {item.get('adaptive_support', 'No')}"
     )
 
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def duplicate_urls(catalog):
+    counts = Counter(item["url"] for item in catalog)
+    return [url for url, n in counts.items() if n > 1]
+
+def fingerprint(ids, hashes) -> str:
+    # Identifies exactly which (id, content) pairs an index holds.
+    pairs = sorted(zip((int(i) for i in ids), hashes))
+    return content_hash("\n".join(f"{i}:{h}" for i, h in pairs))
+
+def load_embedding_cache():
+    if not os.path.exists(EMBEDDINGS_PATH):
+        return None
+
+    data = np.load(EMBEDDINGS_PATH)
+    if str(data["model"]) != MODEL_NAME:
+        print(f"Embedding cache was built with {data['model']}, re-encoding everything")
+        return None
+
+    return {
+        "keys": data["keys"].tolist(),
+        "ids": data["ids"],
+        "hashes": data["hashes"].tolist(),
+        "embeddings": data["embeddings"],
+        "next_id": int(data["next_id"]),
+    }
+
+def save_embedding_cache(keys, ids, hashes, embeddings, next_id):
+    with atomic_path(EMBEDDINGS_PATH) as tmp:
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                model=np.array(MODEL_NAME),
+                keys=np.array(keys),
+                ids=ids,
+                hashes=np.array(hashes),
+                embeddings=embeddings,
+                next_id=np.array(next_id, dtype=np.int64)
+            )
+
+def same_catalog(meta_path, catalog) -> bool:
+    # Fields outside the embedding text (duration, flags) and item order
+    # also end up in the snapshot, so compare the full records.
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f) == catalog
+    except FileNotFoundError:
+        return False
+
+def encode(texts):
+    return get_model().encode(
+        texts,
+        batch_size=32,
+        show_progress_bar=True,
+        convert_to_numpy=True,
+        normalize_embeddings=True
+    ).astype("float32")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the FAISS index and catalog metadata.")
+    parser.add_argument("--index-type", default=os.getenv("FAISS_INDEX_TYPE", "flat"), choices=INDEX_TYPES)
+    parser.add_argument("--nlist", type=int, help="IVF lists (default: ~4*sqrt(n))")
+    parser.add_argument("--nprobe", type=int, help="IVF lists searched per query (default: 16)")
+    parser.add_argument("--pq-m", type=int, help="IVF-PQ sub-quantizers; must divide the dimension (default: 48)")
+    parser.add_argument("--pq-nbits", type=int, help="IVF-PQ bits per code (default: 8)")
+    parser.add_argument("--hnsw-m", type=int, help="HNSW neighbours per node (default: 32)")
+    parser.add_argument("--ef-construction", type=int, help="HNSW build-time beam width (default: 200)")
+    parser.add_argument("--ef-search", type=int, help="HNSW query-time beam width (default: 64)")
+    parser.add_argument("--full", action="store_true", help="Ignore the embedding cache and re-encode every item")
+    parser.add_argument("--keep", type=int, default=KEEP_SNAPSHOTS, help="Index snapshots to keep on disk (default: 3)")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+
     try:
         with open(CATALOG_PATH, "r", encoding="utf-8") as f:
             catalog = json.load(f)
@@ -34,28 +139,164 @@ def main():
         print(f"Error: Could not find {CATALOG_PATH}. Make sure you ran the crawler first.")
         return
 
+    if not catalog:
+        # Nothing to encode or to size the index from; keep serving the
+        # current snapshot.
+        print(f"Error: {CATALOG_PATH} has no items to index.")
+        return
+
+    # Items are identified by URL, both for the embedding cache and when
+    # the API dedups candidate rows.
+    duplicates = duplicate_urls(catalog)
+    if duplicates:
+        print(f"Error: {CATALOG_PATH} lists {len(duplicates)} URLs more than once, e.g. {duplicates[0]}")
+        return
+
     print(f"Indexing {len(catalog)} items...")
     
     texts = [build_embedding_text(i) for i in catalog]
+    keys = [item["url"] for item in catalog]
+    hashes = [content_hash(t) for t in texts]
 
-    embeddings = model.encode(
-        texts,
-        batch_size=32,
-        show_progress_bar=True,
-        convert_to_numpy=True,
-        normalize_embeddings=True
-    ).astype("float32")
+    cache = None if args.full else load_embedding_cache()
+    cached = {}
+    next_id = 0
+    if cache:
+        cached = {
+            key: (int(item_id), h, row)
+            for row, (key, item_id, h) in enumerate(zip(cache["keys"], cache["ids"], cache["hashes"]))
+        }
+        next_id = cache["next_id"]
 
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dim)
-    index.add(embeddings)
-    
-    faiss.write_index(index, INDEX_PATH)
+    # Unchanged items keep their id and embedding; changed items keep their
+    # id but are re-encoded; new items get fresh ids.
+    ids = np.empty(len(catalog), dtype=np.int64)
+    to_encode = []
+    changed_ids = []
+    reused_rows = {}
+    for row, (key, h) in enumerate(zip(keys, hashes)):
+        if key in cached:
+            ids[row] = cached[key][0]
+            if cached[key][1] == h:
+                reused_rows[row] = cached[key][2]
+                continue
+            changed_ids.append(ids[row])
+        else:
+            ids[row] = next_id
+            next_id += 1
+        to_encode.append(row)
+
+    current = set(keys)
+    deleted_ids = [item_id for key, (item_id, _, _) in cached.items() if key not in current]
+
+    print(
+        f"{len(reused_rows)} unchanged, {len(changed_ids)} changed, "
+        f"{len(to_encode) - len(changed_ids)} new, {len(deleted_ids)} deleted"
+    )
+
+    start = time.perf_counter()
+    if to_encode:
+        fresh = encode([texts[row] for row in to_encode])
+        embeddings = np.empty((len(catalog), fresh.shape[1]), dtype=np.float32)
+        embeddings[to_encode] = fresh
+    else:
+        # Non-empty catalog and nothing to encode: every row is in the cache.
+        embeddings = np.empty((len(catalog), cache["embeddings"].shape[1]), dtype=np.float32)
+    if reused_rows:
+        embeddings[list(reused_rows)] = cache["embeddings"][list(reused_rows.values())]
+    print(f"Encoded {len(to_encode)} items in {time.perf_counter() - start:.1f}s")
+
+    requested = {
+        "nlist": args.nlist,
+        "nprobe": args.nprobe,
+        "pq_m": args.pq_m,
+        "pq_nbits": args.pq_nbits,
+        "hnsw_m": args.hnsw_m,
+        "ef_construction": args.ef_construction,
+        "ef_search": args.ef_search,
+    }
+
+    # The on-disk index is patched in place only when it provably holds the
+    # previous cache contents, has the requested type and build settings,
+    # and its type supports deletion. Otherwise it is rebuilt from the
+    # embeddings, which still skips encoding unchanged items.
+    index = None
+    previous = snapshot_paths(current_dir(PROCESSED_DIR))
+    info = read_index_info(previous["info"])
+    matches_previous = (
+        cache
+        and os.path.exists(previous["index"])
+        and info.get("type") == args.index_type
+        and not any(requested[k] is not None for k in BUILD_PARAMS)
+        and info.get("fingerprint") == fingerprint(cache["ids"], cache["hashes"])
+    )
+
+    # A re-crawl that changed nothing (see pipeline/catalog.py) leaves the
+    # published snapshot as is, so serving workers have nothing to reload.
+    if (
+        matches_previous
+        and not to_encode
+        and not deleted_ids
+        and not any(requested[k] is not None for k in SEARCH_PARAMS)
+        and same_catalog(previous["meta"], catalog)
+        and CatalogFeatures.is_current(previous["features"])
+        and LexicalIndex.is_current(previous["lexical"])
+    ):
+        print(f"Catalog unchanged, keeping snapshot {info.get('version', current_dir(PROCESSED_DIR))}")
+        return
+
+    if matches_previous and args.index_type in REMOVABLE_TYPES:
+        index = faiss.read_index(previous["index"])
+        params = dict(info["params"])
+        params.update({k: requested[k] for k in SEARCH_PARAMS if k in params and requested[k] is not None})
+
+        stale = np.array(changed_ids + deleted_ids, dtype=np.int64)
+        if len(stale):
+            index.remove_ids(stale)
+        if to_encode:
+            index.add_with_ids(embeddings[to_encode], ids[to_encode])
+        configure_search(index, args.index_type, params)
+        print(f"Updated index in place: -{len(stale)} +{len(to_encode)} vectors")
+    else:
+        index, params = build_index(embeddings, args.index_type, requested, ids=ids)
+
+    new_info = index_info(index, args.index_type, params)
+    new_info["fingerprint"] = fingerprint(ids, hashes)
+    version = new_version(new_info["fingerprint"])
+    new_info["version"] = version
+
+    # The whole build goes into a fresh snapshot directory that only becomes
+    # visible to the API once CURRENT is switched to it. The embedding cache
+    # is saved before that switch; if the run dies in between, the
+    # fingerprints disagree and the next run rebuilds instead of patching.
+    snapshot_dir = os.path.join(snapshots_dir(PROCESSED_DIR), version)
+    with atomic_dir(snapshot_dir) as tmp:
+        paths = snapshot_paths(tmp)
+        write_index_info(paths["info"], new_info)
+        faiss.write_index(index, paths["index"])
+        np.save(paths["ids"], ids)
+
+        with open(paths["meta"], "w", encoding="utf-8") as f:
+            json.dump(catalog, f, indent=2, ensure_ascii=False)
+
+        CatalogStore(catalog).save(paths["store"])
+
+        lexical = LexicalIndex.build(catalog)
+        lexical.save(paths["lexical"])
+
+        # Query-independent rerank features, so the API does not rescan
+        # names and descriptions on load.
+        CatalogFeatures.build(catalog).save(paths["features"])
 
-    with open(META_PATH, "w", encoding="utf-8") as f:
-        json.dump(catalog, f, indent=2, ensure_ascii=False)
+    save_embedding_cache(keys, ids, hashes, embeddings, next_id)
+    publish(PROCESSED_DIR, version)
+    removed = prune(PROCESSED_DIR, args.keep)
 
-    print(f"Successfully indexed {index.ntotal} items to {INDEX_PATH}")
+    print(f"Successfully indexed {index.ntotal} items ({args.index_type}, {params})")
+    print(f"Keyword index with {len(lexical.tokens)} terms")
+    print(f"Published snapshot {version} to {snapshot_dir}")
+    if removed:
+        print(f"Removed old snapshots: {', '.join(removed)}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
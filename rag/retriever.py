@@ -1,63 +1,335 @@
+import asyncio
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import faiss
-import torch
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from rag.encoders import load_encoder
+from rag.index_types import MMAP_TYPES, configure_search, read_index_info
+from rag.snapshots import current_dir, resolve_version, snapshot_paths
+from rag.store import CatalogStore, Hits
+from rag.utils.features import CatalogFeatures
+from rag.utils.lexical import LexicalIndex
+from rag.utils.metrics import Counter
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(BASE_DIR) 
-INDEX_PATH = os.path.join(PROJECT_ROOT, "data", "processed", "faiss.index")
-META_PATH = os.path.join(PROJECT_ROOT, "data", "processed", "faiss_meta.json")
+PROCESSED_DIR = os.path.join(PROJECT_ROOT, "data", "processed")
 
-_index = None
-_catalog = None
-_model = None
+# Map the index and catalog columns read-only instead of copying them onto
+# the heap; several workers on one host then share a single page-cache copy.
+INDEX_MMAP = os.getenv("INDEX_MMAP", "1") != "0"
 
-def load_resources():
-    global _index, _catalog, _model
-    
-    if _model is None:
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"Loading embedding model on {device}...")
-        _model = SentenceTransformer(
-            "sentence-transformers/all-MiniLM-L6-v2",
-            device=device
-        )
-
-    if _index is None:
-        if not os.path.exists(INDEX_PATH):
+# Optional overrides of the search-time parameters recorded by indexing.py.
+SEARCH_OVERRIDES = {
+    "nprobe": os.getenv("FAISS_NPROBE"),
+    "ef_search": os.getenv("FAISS_EF_SEARCH"),
+}
+
+# Encoding and FAISS search are CPU-bound, so async callers offload them to
+# a bounded pool sized to the available cores instead of the event loop.
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", str(os.cpu_count() or 1)))
+_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieve")
+
+_encoder = None
+_snapshot = None
+_load_lock = threading.Lock()
+_reload_lock = threading.Lock()
+
+# Queries answered from the precomputed static results vs. encoded + searched.
+RETRIEVAL_QUERIES = Counter("retrieval_queries_total", "Vector retrieval queries by path.", ["path"])
+
+# Fixed expansion queries whose embeddings and neighbours every snapshot
+# precomputes (query -> k), so a reload does not lose them.
+_static_queries: Dict[str, int] = {}
+
+def _read_index(path: str, index_type: str = "flat"):
+    if INDEX_MMAP and index_type in MMAP_TYPES:
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        # Newer FAISS builds can also search flat codes in place.
+        flags |= getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        try:
+            return faiss.read_index(path, flags)
+        except RuntimeError as e:
+            print(f"Memory-mapped index load failed ({e}), reading into memory")
+    return faiss.read_index(path)
+
+class IndexSnapshot:
+    # One immutable, fully loaded version of the index files. A request reads
+    # the current snapshot once and uses it throughout, so a reload swapping
+    # in a new one never affects requests already in flight.
+
+    def __init__(self, directory: str, version: str):
+        self.version = version
+        self.directory = directory
+        self.loaded_at = time.time()
+        paths = snapshot_paths(directory)
+
+        if not os.path.exists(paths["index"]):
             raise FileNotFoundError(
-                f"FAISS index not found at {INDEX_PATH}. "
+                f"FAISS index not found at {paths['index']}. "
                 "Please run 'indexing.py' first."
             )
-        _index = faiss.read_index(INDEX_PATH)
+        info = read_index_info(paths["info"])
+        params = dict(info.get("params", {}))
+        params.update({k: int(v) for k, v in SEARCH_OVERRIDES.items() if v and k in params})
+        info["params"] = params
+
+        self.index = _read_index(paths["index"], info["type"])
+        configure_search(self.index, info["type"], params)
+        self.info = info
+        print(f"Loaded {info['type']} index {version} with {self.index.ntotal} vectors")
 
-    if _catalog is None:
-        if not os.path.exists(META_PATH):
+        # Incrementally built indexes return stable item ids, not rows;
+        # faiss_ids.npy maps rows to ids. Older indexes use row ids.
+        self.id_to_row = None
+        if os.path.exists(paths["ids"]):
+            row_ids = np.load(paths["ids"])
+            self.id_to_row = np.full(int(row_ids.max(initial=-1)) + 1, -1, dtype=np.int64)
+            self.id_to_row[row_ids] = np.arange(len(row_ids))
+
+        # Prefer the columnar store written by indexing.py; older builds
+        # only have the JSON metadata, which is parsed as before.
+        catalog = None
+        if os.path.exists(os.path.join(paths["store"], "store.json")):
+            self.store = CatalogStore.load(paths["store"], mmap=INDEX_MMAP)
+        elif os.path.exists(paths["meta"]):
+            with open(paths["meta"], "r", encoding="utf-8") as f:
+                catalog = json.load(f)
+            self.store = CatalogStore(catalog)
+        else:
             raise FileNotFoundError(
-                f"Catalog meta not found at {META_PATH}. "
+                f"Catalog meta not found at {paths['meta']}. "
                 "Please run 'indexing.py' first."
             )
-        with open(META_PATH, "r", encoding="utf-8") as f:
-            _catalog = json.load(f)
 
-def retrieve(query: str, k: int = 20):
+        # Indexes built before the keyword index or the rerank feature table
+        # existed (or with other lexicons) get them computed in memory.
+        if LexicalIndex.is_current(paths["lexical"]):
+            self.lexical = LexicalIndex.load(paths["lexical"], mmap=INDEX_MMAP)
+        else:
+            catalog = catalog or list(self.store.items())
+            self.lexical = LexicalIndex.build(catalog)
+
+        self.features = CatalogFeatures.load(paths["features"], self.store, lexical=self.lexical)
+        if self.features is None:
+            catalog = catalog or list(self.store.items())
+            self.features = CatalogFeatures.build(catalog, lexical=self.lexical)
+
+        # Precomputed embeddings and FAISS neighbours for fixed expansion
+        # queries, keyed by query text.
+        self.static: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self.static_lock = threading.Lock()
+
+    def warm(self, encoder, static_queries: Dict[str, int]):
+        # Touch the mapped index pages with a first search and precompute the
+        # static queries, so the first request on this snapshot is not slow.
+        self.index.search(encoder.encode(["warmup"]), min(20, self.index.ntotal))
+
+        by_k: Dict[int, List[str]] = {}
+        for query, k in static_queries.items():
+            by_k.setdefault(k, []).append(query)
+        for k, queries in by_k.items():
+            q_emb = encoder.encode(queries)
+            D, I = self.index.search(q_emb, k)
+            with self.static_lock:
+                for row, query in enumerate(queries):
+                    self.static[query] = (q_emb[row], D[row], I[row])
+
+    def static_lookup(self, query: str, k: int):
+        if not self.static:
+            return None
+        with self.static_lock:
+            entry = self.static.get(query)
+        if entry is None or len(entry[2]) < k:
+            return None
+        return entry[1][:k], entry[2][:k]
+
+def load_resources():
+    global _snapshot, _encoder
+
+    if _encoder is not None and _snapshot is not None:
+        return
+
+    with _load_lock:
+        if _encoder is None:
+            # Backend (torch, onnx, onnx-int8) comes from EMBEDDING_BACKEND.
+            _encoder = load_encoder()
+
+        if _snapshot is None:
+            _snapshot = IndexSnapshot(current_dir(PROCESSED_DIR), resolve_version(PROCESSED_DIR))
+
+def get_snapshot() -> IndexSnapshot:
+    load_resources()
+    return _snapshot
+
+def reload_index(force: bool = False) -> Tuple[bool, str]:
+    # Loads and warms the published snapshot off to the side, then swaps it
+    # in with a single reference assignment. Returns (swapped, version).
+    global _snapshot
+    load_resources()
+
+    with _reload_lock:
+        old = _snapshot
+        version = resolve_version(PROCESSED_DIR)
+        if version == old.version and not force:
+            return False, version
+
+        start = time.perf_counter()
+        snapshot = IndexSnapshot(current_dir(PROCESSED_DIR), version)
+        snapshot.warm(_encoder, dict(_static_queries))
+        # Keywords the old snapshot already resolved are likely to come again.
+        for keyword in old.features.cached_keywords():
+            snapshot.features.keyword_hits(keyword)
+
+        _snapshot = snapshot
+        print(f"Swapped index {old.version} -> {version} in {time.perf_counter() - start:.2f}s")
+        return True, version
+
+def watch_index(interval: float) -> threading.Thread:
+    # Polls the published version and reloads when it changes. Each worker
+    # process runs its own watcher, so all of them pick up a new snapshot.
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                reload_index()
+            except Exception as e:
+                print(f"Index reload failed: {e}")
+
+    thread = threading.Thread(target=loop, name="index-watch", daemon=True)
+    thread.start()
+    return thread
+
+def get_index_info() -> Dict:
+    return get_snapshot().info
+
+def get_catalog_store() -> CatalogStore:
+    return get_snapshot().store
+
+def get_catalog_features() -> CatalogFeatures:
+    return get_snapshot().features
+
+def set_encoder(encoder):
+    # Swap the query encoder, e.g. to compare backends in one process.
+    # Cached static embeddings belong to the previous encoder.
+    global _encoder
+    with _load_lock:
+        _encoder = encoder
+    if _snapshot is not None:
+        with _snapshot.static_lock:
+            _snapshot.static.clear()
+
+def _encode(queries: List[str]) -> np.ndarray:
+    return _encoder.encode(queries)
+
+def warm_static_queries(queries: Iterable[str], k: int = 20):
+    load_resources()
+
+    queries = list(dict.fromkeys(queries))
+    if not queries:
+        return
+
+    for query in queries:
+        _static_queries[query] = k
+    _snapshot.warm(_encoder, {query: k for query in queries})
+
+def warmup(static_queries: Iterable[str] = (), k: int = 20):
+    # Pay every one-time cost before the first request: model and index
+    # load, the first forward pass, touching the mapped index pages, and the
+    # static expansion queries.
+    load_resources()
+    for query in dict.fromkeys(static_queries):
+        _static_queries[query] = k
+    _snapshot.warm(_encoder, dict(_static_queries))
+
+def _to_hits(snapshot: IndexSnapshot, scores: np.ndarray, ids: np.ndarray) -> Hits:
+    valid = ids != -1
+    rows = ids[valid].astype(np.int64)
+    scores = scores[valid]
+    if snapshot.id_to_row is not None:
+        in_range = rows < len(snapshot.id_to_row)
+        rows = snapshot.id_to_row[rows[in_range]]
+        scores = scores[in_range]
+        known = rows != -1
+        rows, scores = rows[known], scores[known]
+    return Hits(rows, scores)
+
+def encode_queries(queries: List[str]) -> np.ndarray:
     load_resources()
-    
-    q_emb = _model.encode(
-        [query],
-        convert_to_numpy=True,
-        normalize_embeddings=True
-    ).astype("float32")
-
-    D, I = _index.search(q_emb, k)
-    
+    return _encode(queries)
+
+def retrieve_many(
+    queries: List[str],
+    ks: Union[int, Sequence[int]] = 20,
+    snapshot: Optional[IndexSnapshot] = None,
+    embeddings: Optional[Dict[str, np.ndarray]] = None,
+) -> List[Hits]:
+    # `embeddings` holds query vectors the caller already encoded.
+    snapshot = snapshot or get_snapshot()
+
+    if not queries:
+        return []
+
+    if isinstance(ks, int):
+        ks = [ks] * len(queries)
+    if len(ks) != len(queries):
+        raise ValueError("retrieve_many expects one k per query")
+
+    hits = [snapshot.static_lookup(q, k) for q, k in zip(queries, ks)]
+    pending = [row for row, hit in enumerate(hits) if hit is None]
+    RETRIEVAL_QUERIES.inc(len(queries) - len(pending), path="static")
+    RETRIEVAL_QUERIES.inc(len(pending), path="encoded")
+
+    # One forward pass and one FAISS search for every uncached query; each
+    # query then takes the prefix of the shared top-max(k) result.
+    if pending:
+        embeddings = embeddings or {}
+        missing = [queries[row] for row in pending if queries[row] not in embeddings]
+        encoded = iter(_encode(missing) if missing else ())
+        q_emb = np.stack([
+            embeddings[queries[row]] if queries[row] in embeddings else next(encoded)
+            for row in pending
+        ]).astype(np.float32, copy=False)
+        D, I = snapshot.index.search(q_emb, max(ks[row] for row in pending))
+        for pos, row in enumerate(pending):
+            hits[row] = (D[pos][:ks[row]], I[pos][:ks[row]])
+
+    return [_to_hits(snapshot, scores, ids) for scores, ids in hits]
+
+def retrieve_lexical(terms: List[str], k: int = 20, snapshot: Optional[IndexSnapshot] = None) -> Hits:
+    snapshot = snapshot or get_snapshot()
+
+    ranked = snapshot.lexical.search(terms, k)
+    return Hits(
+        np.array([row for row, _ in ranked], dtype=np.int64),
+        np.array([score for _, score in ranked], dtype=np.float32),
+    )
+
+def retrieve(query: str, k: int = 20) -> List[Dict]:
+    snapshot = get_snapshot()
+    hits = retrieve_many([query], [k], snapshot)[0]
+
     results = []
-    for score, idx in zip(D[0], I[0]):
-        if idx != -1:
-            item = _catalog[idx].copy()
-            item["vector_score"] = float(score) 
-            results.append(item)
-            
-    return results
\ No newline at end of file
+    for row, score in zip(hits.rows, hits.scores):
+        item = snapshot.store.item(row)
+        item["vector_score"] = float(score)
+        results.append(item)
+    return results
+
+async def aencode_queries(queries: List[str]) -> np.ndarray:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, encode_queries, queries)
+
+async def aretrieve_many(
+    queries: List[str],
+    ks: Union[int, Sequence[int]] = 20,
+    snapshot: Optional[IndexSnapshot] = None,
+    embeddings: Optional[Dict[str, np.ndarray]] = None,
+) -> List[Hits]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, retrieve_many, queries, ks, snapshot, embeddings)
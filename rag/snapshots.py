@@ -0,0 +1,94 @@
+import os
+import shutil
+import time
+from typing import Dict, List, Optional
+
+from rag.utils.atomic import atomic_path
+
+# Every indexing run writes a complete, immutable snapshot directory under
+# data/processed/snapshots/<version>/ and then publishes it by atomically
+# rewriting data/processed/CURRENT. Readers resolve CURRENT once and load
+# every file from that one directory, so they never mix two builds.
+# Trees indexed before snapshots existed keep their files directly in
+# data/processed/, which uses the same file names.
+
+SNAPSHOT_FILES = {
+    "index": "faiss.index",
+    "info": "faiss_index_info.json",
+    "ids": "faiss_ids.npy",
+    "meta": "faiss_meta.json",
+    "store": "catalog_store",
+    "lexical": "lexical_index",
+    "features": "rerank_features.npz",
+}
+
+CURRENT_FILE = "CURRENT"
+SNAPSHOTS_SUBDIR = "snapshots"
+
+
+def snapshot_paths(directory: str) -> Dict[str, str]:
+    return {name: os.path.join(directory, filename) for name, filename in SNAPSHOT_FILES.items()}
+
+
+def snapshots_dir(processed_dir: str) -> str:
+    return os.path.join(processed_dir, SNAPSHOTS_SUBDIR)
+
+
+def current_version(processed_dir: str) -> Optional[str]:
+    try:
+        with open(os.path.join(processed_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def current_dir(processed_dir: str) -> str:
+    version = current_version(processed_dir)
+    if version is None:
+        return processed_dir
+    return os.path.join(snapshots_dir(processed_dir), version)
+
+
+def legacy_version(processed_dir: str) -> str:
+    # Unversioned layouts are identified by the index file's mtime.
+    try:
+        return f"legacy-{os.stat(snapshot_paths(processed_dir)['index']).st_mtime_ns}"
+    except OSError:
+        return "legacy"
+
+
+def resolve_version(processed_dir: str) -> str:
+    return current_version(processed_dir) or legacy_version(processed_dir)
+
+
+def new_version(fingerprint: str) -> str:
+    # Sortable by build time; the fingerprint tells same-second builds apart.
+    return time.strftime("%Y%m%dT%H%M%SZ", time.gmtime()) + "-" + fingerprint[:8]
+
+
+def publish(processed_dir: str, version: str):
+    with atomic_path(os.path.join(processed_dir, CURRENT_FILE)) as tmp:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(version + "\n")
+
+
+def prune(processed_dir: str, keep: int) -> List[str]:
+    # Drops all but the newest `keep` snapshots (never the current one).
+    # Workers still serving a removed snapshot keep their open and mapped
+    # files until they reload; the kernel frees them afterwards.
+    root = snapshots_dir(processed_dir)
+    if not os.path.isdir(root):
+        return []
+
+    current = current_version(processed_dir)
+    versions = sorted(
+        (name for name in os.listdir(root) if not name.startswith(".")),
+        reverse=True
+    )
+    removed = []
+    for version in versions[max(keep, 1):]:
+        if version == current:
+            continue
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+        removed.append(version)
+    return removed
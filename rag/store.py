@@ -0,0 +1,154 @@
+import json
+import os
+import sys
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+MISSING_DURATION = -1
+
+STORE_FORMAT_VERSION = 1
+STRING_COLUMNS = ("urls", "names", "descriptions")
+ARRAY_COLUMNS = ("duration", "remote_support", "adaptive_support", "type_offsets", "type_codes")
+
+
+class Hits(NamedTuple):
+    rows: np.ndarray
+    scores: np.ndarray
+
+
+def empty_hits() -> Hits:
+    return Hits(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+
+
+class StringTable:
+    # UTF-8 blob plus offsets; rows are decoded on access, so a memory-mapped
+    # table costs nothing until a row is actually read.
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings: Sequence[str]) -> "StringTable":
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(data, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return self.data[start:end].tobytes().decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for row in range(len(self)):
+            yield self[row]
+
+
+class CatalogStore:
+    # Columnar, read-only view of faiss_meta.json. Retrieval and rerank work
+    # on integer row ids; dicts are only materialized for the response.
+
+    def __init__(self, catalog: Optional[List[Dict]] = None):
+        if catalog is None:
+            return
+
+        n = len(catalog)
+        self.size = n
+
+        self.urls = [sys.intern(item["url"]) for item in catalog]
+        self.names = [item.get("name", "") for item in catalog]
+        self.descriptions = [item.get("description", "") for item in catalog]
+
+        self.duration = np.array(
+            [MISSING_DURATION if item.get("duration") is None else item["duration"] for item in catalog],
+            dtype=np.int32
+        )
+        self.remote_support = np.array(
+            [item.get("remote_support") == "Yes" for item in catalog], dtype=bool
+        )
+        self.adaptive_support = np.array(
+            [item.get("adaptive_support") == "Yes" for item in catalog], dtype=bool
+        )
+
+        # Test types keep their per-item order: codes are interned into a
+        # small table and stored CSR-style as (offsets, code ids).
+        self.type_table: List[str] = []
+        code_ids: Dict[str, int] = {}
+        offsets = [0]
+        codes = []
+        for item in catalog:
+            for code in item.get("test_type", []):
+                if code not in code_ids:
+                    code_ids[code] = len(self.type_table)
+                    self.type_table.append(sys.intern(code))
+                codes.append(code_ids[code])
+            offsets.append(len(codes))
+        self.type_offsets = np.array(offsets, dtype=np.int64)
+        self.type_codes = np.array(codes, dtype=np.uint8)
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+
+        for name in STRING_COLUMNS:
+            table = getattr(self, name)
+            if not isinstance(table, StringTable):
+                table = StringTable.from_strings(table)
+            np.save(os.path.join(directory, f"{name}_data.npy"), table.data)
+            np.save(os.path.join(directory, f"{name}_offsets.npy"), table.offsets)
+
+        for name in ARRAY_COLUMNS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+        with open(os.path.join(directory, "store.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": STORE_FORMAT_VERSION, "size": self.size, "type_table": self.type_table},
+                f
+            )
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "CatalogStore":
+        with open(os.path.join(directory, "store.json"), "r", encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("version") != STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported catalog store version in {directory}")
+
+        # Read-only memory maps: every worker shares the same page cache.
+        mmap_mode = "r" if mmap else None
+        load = lambda name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+
+        store = cls()
+        store.size = header["size"]
+        store.type_table = [sys.intern(code) for code in header["type_table"]]
+        for name in STRING_COLUMNS:
+            setattr(store, name, StringTable(load(f"{name}_data"), load(f"{name}_offsets")))
+        for name in ARRAY_COLUMNS:
+            setattr(store, name, load(name))
+        return store
+
+    def __len__(self) -> int:
+        return self.size
+
+    def test_types(self, row: int) -> List[str]:
+        start, end = self.type_offsets[row], self.type_offsets[row + 1]
+        return [self.type_table[code] for code in self.type_codes[start:end]]
+
+    def item(self, row: int) -> Dict:
+        duration = int(self.duration[row])
+        return {
+            "url": self.urls[row],
+            "name": self.names[row],
+            "adaptive_support": "Yes" if self.adaptive_support[row] else "No",
+            "description": self.descriptions[row],
+            "duration": None if duration == MISSING_DURATION else duration,
+            "remote_support": "Yes" if self.remote_support[row] else "No",
+            "test_type": self.test_types(row),
+        }
+
+    def items(self) -> Iterator[Dict]:
+        for row in range(self.size):
+            yield self.item(row)
@@ -1,11 +1,14 @@
-from rag.utils.intent import infer_intent
+from rag.utils.intent import infer_intent, ainfer_intent
 from rag.utils.rerank import rerank
+from rag.utils.classifier import classify_intent
 from rag.utils.models import UserIntent
 from rag.utils.keywords import normalize_keywords
 
 __all__ = [
     "infer_intent",
+    "ainfer_intent",
     "rerank",
+    "classify_intent",
     "UserIntent",
     "normalize_keywords",
 ]
@@ -0,0 +1,213 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from rag.utils.keywords import KEYWORD_MAPPING
+
+# Deterministic, regex-based intent extraction. It fills the same fields as
+# the LLM intent (see UserIntent) and reports how much it trusts the result,
+# so infer_intent only pays for an Ollama round-trip on ambiguous queries.
+
+CATEGORY_LEXICON = {
+    "tech": [
+        "developer", "developers", "programmer", "programming", "software",
+        "engineer", "engineering", "coding", "coder", "devops", "full stack",
+        "frontend", "front end", "backend", "back end", "data scientist",
+        "data analyst", "machine learning", "automation", "selenium", "tester",
+        "java", "javascript", "java script", "python", "sql", "c++", "c#",
+        ".net", "react", "angular", "node", "html", "css", "aws", "cloud",
+    ],
+    "sales": [
+        "sales", "selling", "salesperson", "business development",
+        "account manager", "account executive", "negotiation", "commercial",
+        "pre-sales", "presales",
+    ],
+    "admin": [
+        "admin", "administrative", "administration", "administrator",
+        "clerical", "clerk", "data entry", "typing", "receptionist",
+        "office assistant", "secretary", "back office",
+    ],
+    "leadership": [
+        "leadership", "leader", "leaders", "executive", "executives",
+        "director", "head of", "ceo", "coo", "cfo", "cxo", "vp",
+        "senior management", "people manager", "strategic",
+    ],
+    "marketing": [
+        "marketing", "marketer", "brand", "branding", "seo", "advertising",
+        "digital marketing", "content writer", "social media", "campaign",
+    ],
+    "finance": [
+        "finance", "financial", "accounting", "accountant", "accounts",
+        "bookkeeping", "audit", "auditor", "banking", "bank", "payable",
+        "receivable",
+    ],
+    "hr": [
+        "hr", "human resources", "recruiter", "recruitment",
+        "talent acquisition", "payroll",
+    ],
+    "general": [
+        "aptitude", "reasoning", "cognitive", "ability", "numerical",
+        "verbal", "inductive", "deductive",
+    ],
+    "operations": [
+        "operations", "supply chain", "logistics", "warehouse", "procurement",
+    ],
+}
+
+SKILL_TERMS = [
+    "java", "javascript", "python", "sql", "c++", "c#", ".net", "react",
+    "angular", "node.js", "html", "css", "selenium", "excel", "tableau",
+    "aws", "docker", "kubernetes", "linux", "spring", "hibernate", "php",
+    "ruby", "golang", "scala", "swift", "kotlin", "typescript", "machine learning",
+    "data science", "testing", "manual testing", "automation", "accounting",
+    "communication", "collaboration", "teamwork", "negotiation",
+    "presentation", "writing", "english", "microsoft office", "ms word",
+    "microsoft word",
+    "outlook", "powerpoint", "data entry", "typing",
+]
+
+BEHAVIORAL_TERMS = [
+    "collaborate", "collaboration", "collaborative", "communication",
+    "communicate", "teamwork", "team player", "interpersonal",
+    "soft skill", "soft skills", "personality", "culture fit", "cultural fit",
+    "behaviour", "behavior", "behavioural", "behavioral", "stakeholder",
+    "people skills", "attitude", "emotional intelligence",
+]
+
+ENTRY_LEVEL_TERMS = [
+    "graduate", "graduates", "fresher", "freshers", "entry level",
+    "entry-level", "junior", "trainee", "intern", "internship", "new grad",
+    "campus", "0-2 years", "0 - 2 years", "0 to 2 years", "1-2 years",
+]
+
+# Stems that hint at a field the lexicons above failed to fill ("culturally
+# a right fit", "within the hour"). A query with such a leftover signal is
+# left to the LLM.
+UNMATCHED_HINTS = {
+    "behavioral": re.compile(
+        r"cultur|\bfit\b|team|collaborat|communicat|interpersonal|personalit|"
+        r"soft|attitude|stakeholder|people"
+    ),
+    "duration_max": re.compile(r"\b(?:min|mins|minutes?|hours?|hrs?|duration|time limit)\b"),
+    "is_entry_level": re.compile(r"graduat|fresher|junior|entry|trainee|intern"),
+}
+
+# Queries longer than this are usually pasted job descriptions whose intent
+# the lexicons capture only partially; trust the LLM more for those.
+LONG_QUERY_WORDS = 40
+
+_NUMBER_WORDS = {
+    "an": 1.0, "a": 1.0, "one": 1.0, "two": 2.0, "three": 3.0,
+    "half an": 0.5, "half a": 0.5,
+}
+
+_DURATION_RE = re.compile(
+    r"(?<![\w.])(?P<num>\d+(?:\.\d+)?|half an|half a|an|a|one|two|three)\s*"
+    r"(?:-|to)?\s*(?P<num2>\d+(?:\.\d+)?)?\s*"
+    r"(?P<unit>hours?|hrs?|minutes?|mins?)\b"
+)
+
+
+def _term_pattern(terms: List[str]) -> "re.Pattern":
+    # Longest terms first so "java script" wins over "java"; lookarounds
+    # instead of \b so terms like "c++", "c#" and ".net" match cleanly.
+    ordered = sorted(set(terms), key=len, reverse=True)
+    return re.compile(
+        r"(?<![\w])(" + "|".join(re.escape(t) for t in ordered) + r")(?![\w])"
+    )
+
+
+_CATEGORY_PATTERNS = {
+    category: _term_pattern(terms) for category, terms in CATEGORY_LEXICON.items()
+}
+_SKILL_PATTERN = _term_pattern(SKILL_TERMS + list(KEYWORD_MAPPING.keys()))
+_BEHAVIORAL_PATTERN = _term_pattern(BEHAVIORAL_TERMS)
+_ENTRY_LEVEL_PATTERN = _term_pattern(ENTRY_LEVEL_TERMS)
+
+
+def _to_number(text: str) -> float:
+    if text in _NUMBER_WORDS:
+        return _NUMBER_WORDS[text]
+    return float(text)
+
+
+# What may separate the hours and minutes of one duration ("1 hour 30
+# minutes", "1 hr and 30 mins").
+_DURATION_JOIN_RE = re.compile(r"\s*(?:,|and)?\s*")
+
+
+def extract_duration(query: str) -> Optional[int]:
+    # Hours followed directly by minutes add up to one duration; separate
+    # durations ("30 or 45 minutes", "30-45 minutes") are alternatives and
+    # the longest one is the limit.
+    q = query.lower()
+    durations = []
+    previous = None
+    for match in _DURATION_RE.finditer(q):
+        value = _to_number(match.group("num"))
+        if match.group("num2"):
+            value = max(value, float(match.group("num2")))
+        hours = match.group("unit").startswith("h")
+        if hours:
+            value *= 60
+
+        if (
+            previous is not None
+            and previous.group("unit").startswith("h")
+            and not previous.group("num2")
+            and not hours
+            and _DURATION_JOIN_RE.fullmatch(q, previous.end(), match.start())
+        ):
+            durations[-1] += value
+        else:
+            durations.append(value)
+        previous = match
+
+    if not durations:
+        return None
+    return int(round(max(durations)))
+
+
+def unmatched_signals(query: str, intent: Dict[str, Any]) -> List[str]:
+    # Intent fields left empty although the query hints at them.
+    q = query.lower()
+    return [field for field, hint in UNMATCHED_HINTS.items() if not intent[field] and hint.search(q)]
+
+
+def classify_intent(query: str) -> Tuple[Dict[str, Any], float]:
+    q = query.lower()
+
+    categories = {
+        category
+        for category, pattern in _CATEGORY_PATTERNS.items()
+        if pattern.search(q)
+    }
+
+    keywords = list(dict.fromkeys(m.group(1) for m in _SKILL_PATTERN.finditer(q)))
+    behavioral = bool(_BEHAVIORAL_PATTERN.search(q))
+    duration_max = extract_duration(q)
+    is_entry_level = bool(_ENTRY_LEVEL_PATTERN.search(q))
+
+    intent = {
+        "categories": categories,
+        "explicit_keywords": keywords,
+        "behavioral": behavioral,
+        "duration_max": duration_max,
+        "is_entry_level": is_entry_level,
+    }
+
+    # Only a category backed by an explicit keyword, with nothing the
+    # lexicons missed, clears the default fast-path threshold (0.8).
+    if not categories:
+        confidence = 0.2 + (0.2 if keywords or behavioral else 0.0)
+    else:
+        confidence = 0.6
+        if keywords:
+            confidence += 0.3
+        if unmatched_signals(q, intent):
+            confidence -= 0.3
+        if len(categories) >= 3:
+            confidence -= 0.15
+        if len(q.split()) > LONG_QUERY_WORDS:
+            confidence -= 0.3
+
+    return intent, max(0.0, min(1.0, confidence))
@@ -0,0 +1,236 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag.store import CatalogStore
+from rag.utils.lexical import LexicalIndex
+
+TEST_TYPE_CODES = ["A", "B", "C", "D", "E", "K", "P", "S"]
+
+# Name lexicons used by the rerank rules. A column is true when any of its
+# terms is a substring of the lower-cased assessment name.
+NAME_LEXICONS = {
+    "coding": ["coding", "automata"],
+    "tech_dev": ["development", "engineering", "programming"],
+    "sales": ["sales"],
+    "sales_negotiation": ["negotiation", "commercial"],
+    "leadership_role": ["manager", "leader", "executive", "strategic"],
+    "leadership_opq": ["opq", "leadership"],
+    "admin": ["admin", "clerical", "typing", "data entry", "office", "outlook", "word"],
+    "marketing": ["marketing", "brand", "advertising", "seo", "digital"],
+    "finance": ["accounting", "financial", "payable", "receivable", "money"],
+    "hr": ["human resources", "training"],
+    "verify": ["verify", "reasoning", "calculation", "comprehension"],
+    "behavioral": ["communication", "team", "interpersonal", "motivation", "personality"],
+    "entry_level": ["graduate", "entry level", "screen", "fundamental", "basic"],
+    "customer_service": ["customer service", "call center"],
+    "communication": ["communication"],
+}
+
+# Columns of the scoring matrix: one per rule predicate in rerank.
+FEATURE_COLUMNS = [
+    "type_K",
+    "type_A",
+    "sim_coding",
+    "soft_type",
+    "hard_type",
+    "soft_bucket",
+] + list(NAME_LEXICONS)
+
+MAX_CACHED_KEYWORDS = 4096
+
+# Interleave buckets for behavioural queries, in rerank's precedence order:
+# soft skills first, then hard skills, then everything else.
+SOFT, HARD, OTHER = 0, 1, 2
+
+# Bump when the meaning of a column changes without its name changing.
+FEATURES_VERSION = 2
+
+
+def features_fingerprint() -> str:
+    # Identifies the lexicons and column layout a feature table was built
+    # with; a table with a different fingerprint is recomputed on load.
+    spec = json.dumps(
+        [FEATURES_VERSION, TEST_TYPE_CODES, FEATURE_COLUMNS, NAME_LEXICONS], sort_keys=True
+    )
+    return hashlib.sha256(spec.encode("utf-8")).hexdigest()
+
+
+class LowerStrings:
+    # Lower-cased view of a string column. Over the snapshot's memory-mapped
+    # StringTable the text stays shared in the page cache instead of being
+    # copied into every worker; rows are only read the first time a keyword
+    # is matched (keyword_hits caches the result).
+
+    def __init__(self, strings: Sequence[str]):
+        self.strings = strings
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def __getitem__(self, row: int) -> str:
+        return self.strings[row].lower()
+
+    def __iter__(self) -> Iterator[str]:
+        return (text.lower() for text in self.strings)
+
+
+class CatalogFeatures:
+    # Query-independent rerank inputs per catalog row: test type flags,
+    # duration, the feature matrix and the interleave bucket, plus the
+    # lower-cased name and description for keyword matching. indexing.py
+    # writes the numeric part next to the index with save(); the API loads
+    # it instead of rescanning the catalog and reads the text from the
+    # snapshot's CatalogStore.
+
+    def __init__(
+        self,
+        names: Sequence[str],
+        descriptions: Sequence[str],
+        test_types: np.ndarray,
+        duration: np.ndarray,
+        flags: np.ndarray,
+        lexical: Optional[LexicalIndex] = None,
+    ):
+        self.size = len(names)
+        self.lexical = lexical
+        self.names = names
+        self.descriptions = descriptions
+        self.test_types = test_types
+        self.duration = duration
+
+        self.columns = {name: i for i, name in enumerate(FEATURE_COLUMNS)}
+        self.flags = flags
+        self.matrix = flags.astype(np.float64)
+        self.bucket = np.where(
+            self.column("soft_bucket"), SOFT, np.where(self.column("hard_type"), HARD, OTHER)
+        ).astype(np.int8)
+
+        self._keyword_hits: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._keyword_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, catalog: List[Dict], lexical: Optional[LexicalIndex] = None) -> "CatalogFeatures":
+        n = len(catalog)
+        names = [item.get("name", "").lower() for item in catalog]
+        descriptions = [item.get("description", "").lower() for item in catalog]
+
+        test_types = np.zeros((n, len(TEST_TYPE_CODES)), dtype=bool)
+        code_index = {code: i for i, code in enumerate(TEST_TYPE_CODES)}
+        for row, item in enumerate(catalog):
+            for code in item.get("test_type", []):
+                if code in code_index:
+                    test_types[row, code_index[code]] = True
+
+        # Missing and zero durations both count as "unknown", like `if dur:`.
+        duration = np.array(
+            [item.get("duration") or np.nan for item in catalog],
+            dtype=np.float64
+        )
+
+        columns = {name: i for i, name in enumerate(FEATURE_COLUMNS)}
+        flags = np.zeros((n, len(FEATURE_COLUMNS)), dtype=bool)
+
+        for name, terms in NAME_LEXICONS.items():
+            flags[:, columns[name]] = [
+                any(term in item_name for term in terms) for item_name in names
+            ]
+
+        def has(code):
+            return test_types[:, code_index[code]]
+
+        soft_type = has("P") | has("B") | has("C")
+        flags[:, columns["type_K"]] = has("K")
+        flags[:, columns["type_A"]] = has("A")
+        flags[:, columns["sim_coding"]] = has("S") & flags[:, columns["coding"]]
+        flags[:, columns["soft_type"]] = soft_type
+        flags[:, columns["hard_type"]] = has("K") | has("S") | has("A")
+        flags[:, columns["soft_bucket"]] = soft_type | flags[:, columns["communication"]]
+
+        return cls(names, descriptions, test_types, duration, flags, lexical=lexical)
+
+    def save(self, path: str):
+        np.savez(
+            path,
+            fingerprint=np.array(features_fingerprint()),
+            columns=np.array(FEATURE_COLUMNS),
+            test_types=self.test_types,
+            duration=self.duration,
+            flags=self.flags,
+        )
+
+    @staticmethod
+    def is_current(path: str) -> bool:
+        # The table exists and was built with the current lexicons.
+        if not os.path.exists(path):
+            return False
+        with np.load(path, allow_pickle=False) as data:
+            return str(data["fingerprint"]) == features_fingerprint()
+
+    @classmethod
+    def load(
+        cls, path: str, store: CatalogStore, lexical: Optional[LexicalIndex] = None
+    ) -> Optional["CatalogFeatures"]:
+        # None if the table is missing, was built with other lexicons or
+        # does not match the store's rows.
+        if not cls.is_current(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            if len(data["flags"]) != len(store):
+                return None
+            return cls(
+                LowerStrings(store.names),
+                LowerStrings(store.descriptions),
+                data["test_types"],
+                data["duration"],
+                data["flags"],
+                lexical=lexical,
+            )
+
+    def column(self, name: str) -> np.ndarray:
+        return self.flags[:, self.columns[name]]
+
+    def keyword_hits(self, keyword: str) -> Tuple[np.ndarray, np.ndarray]:
+        # Catalog-wide (name_hit, description_hit) vectors for one keyword,
+        # computed on first use and shared by every later request.
+        hits = self._keyword_hits.get(keyword)
+        if hits is not None:
+            return hits
+
+        if keyword in ("javascript", "js"):
+            name_hit = self._field_hits("javascript", "name", lambda t: "javascript" in t)
+            desc_hit = self._field_hits("javascript", "description", lambda t: "javascript" in t)
+        elif keyword == "java":
+            java_only = lambda t: "javascript" not in t and "java" in t
+            name_hit = self._field_hits("java", "name", java_only)
+            desc_hit = self._field_hits("java", "description", java_only)
+        else:
+            name_hit = self._field_hits(keyword, "name", lambda t: keyword in t)
+            desc_hit = self._field_hits(keyword, "description", lambda t: keyword in t)
+
+        with self._keyword_lock:
+            if len(self._keyword_hits) >= MAX_CACHED_KEYWORDS:
+                self._keyword_hits.clear()
+            self._keyword_hits[keyword] = (name_hit, desc_hit)
+        return name_hit, desc_hit
+
+    def cached_keywords(self) -> List[str]:
+        with self._keyword_lock:
+            return list(self._keyword_hits)
+
+    def _field_hits(self, needle: str, field: str, predicate: Callable[[str], bool]) -> np.ndarray:
+        texts = self.names if field == "name" else self.descriptions
+
+        rows = self.lexical.candidate_rows(needle, field) if self.lexical else None
+        if rows is None:
+            return np.array([predicate(text) for text in texts], dtype=bool)
+
+        # Only rows containing every trigram of the needle can match.
+        hits = np.zeros(self.size, dtype=bool)
+        for row in rows:
+            hits[row] = predicate(texts[row])
+        return hits
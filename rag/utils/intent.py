@@ -1,11 +1,23 @@
+import asyncio
 import os
-from typing import Optional, Dict, Any
+import random
+import threading
+import weakref
+from typing import Awaitable, Callable, Optional, Dict, Any, Tuple
+
+import numpy as np
+
+import httpx
 
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_ollama import ChatOllama
 
+from rag.utils.cache import TTLCache
+from rag.utils.classifier import classify_intent
+from rag.utils.metrics import CallbackMetric, Counter
 from rag.utils.models import UserIntent
+from rag.utils.semantic_cache import SEMANTIC_CACHE_AUDIT_RATE, semantic_cache
 
 
 # Use environment variables with defaults for EC2 Ubuntu
@@ -13,21 +25,98 @@ from rag.utils.models import UserIntent
 # For EC2 Ubuntu (native): use default http://localhost:11434
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "60"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "16"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "120"))
 
+# Queries the local classifier is at least this confident about skip the LLM.
+# Set above 1 to always call Ollama, or to 0 to never call it.
+INTENT_FAST_PATH_THRESHOLD = float(os.getenv("INTENT_FAST_PATH_THRESHOLD", "0.8"))
 
-def infer_intent_with_langchain(query: str) -> Optional[Dict[str, Any]]:
-    try:
-        llm = ChatOllama(
-            model=OLLAMA_MODEL,
-            base_url=OLLAMA_BASE_URL,
-            format="json",
-            temperature=0,
-        )
+# Seconds an async request waits for the LLM before answering with the
+# classifier's intent. Off by default (0 = wait for it, as before); set it
+# from the LLM latency measured on the deployment. The call itself keeps
+# running and fills the cache for the next request with the same query.
+INTENT_LLM_DEADLINE = float(os.getenv("INTENT_LLM_DEADLINE", "0"))
+
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "2048"))
+INTENT_CACHE_TTL = float(os.getenv("INTENT_CACHE_TTL", "3600"))
+
+# Process-wide cache of LLM intents keyed by the normalized query, so repeated
+# queries (and the rerank stage of the same request) never hit Ollama twice.
+_intent_cache = TTLCache(maxsize=INTENT_CACHE_SIZE, ttl=INTENT_CACHE_TTL)
+_inflight_lock = threading.Lock()
+_inflight: Dict[str, threading.Lock] = {}
+_ainflight: Dict[str, "asyncio.Future"] = {}
+# Background semantic-cache audits, referenced until they finish.
+_audits: "set[asyncio.Future]" = set()
+
+# One chain (and therefore one pooled keep-alive HTTP client per sync/async
+# flavour) is shared by every request. It is built lazily on first use.
+_chain = None
+_chain_lock = threading.Lock()
+
+# How each intent lookup was answered: cache, fast_path (local
+# classifier), semantic (borrowed from a cached paraphrase), llm,
+# fallback (the LLM failed, classifier intent used) or timeout (the LLM
+# missed INTENT_LLM_DEADLINE, classifier intent used).
+INTENT_SOURCE = Counter("intent_lookups_total", "Intent lookups by how they were answered.", ["source"])
+LLM_ERRORS = Counter("intent_llm_errors_total", "Failed Ollama intent calls (GenAI Intent Error).")
+CallbackMetric("intent_cache_hits_total", "Intent cache hits.", "counter", lambda: _intent_cache.hits)
+CallbackMetric("intent_cache_misses_total", "Intent cache misses.", "counter", lambda: _intent_cache.misses)
+CallbackMetric("intent_cache_size", "Entries in the intent cache.", "gauge", lambda: len(_intent_cache))
+
+_stats_lock = threading.Lock()
+_connection_stats = {"requests": 0, "new_connections": 0}
+_seen_streams: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def _record_response(response: httpx.Response) -> None:
+    stream = response.extensions.get("network_stream")
+    with _stats_lock:
+        _connection_stats["requests"] += 1
+        if stream is None:
+            return
+        if stream not in _seen_streams:
+            _connection_stats["new_connections"] += 1
+            _seen_streams.add(stream)
+
+
+async def _arecord_response(response: httpx.Response) -> None:
+    _record_response(response)
+
+
+def connection_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_connection_stats)
+    stats["reused"] = stats["requests"] - stats["new_connections"]
+    stats["chain_built"] = _chain is not None
+    return stats
+
+
+def _build_chain():
+    llm = ChatOllama(
+        model=OLLAMA_MODEL,
+        base_url=OLLAMA_BASE_URL,
+        format="json",
+        temperature=0,
+        client_kwargs={
+            "timeout": httpx.Timeout(OLLAMA_READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT),
+            "limits": httpx.Limits(
+                max_connections=OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=OLLAMA_MAX_CONNECTIONS,
+                keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY,
+            ),
+        },
+        sync_client_kwargs={"event_hooks": {"response": [_record_response]}},
+        async_client_kwargs={"event_hooks": {"response": [_arecord_response]}},
+    )
 
-        parser = JsonOutputParser(pydantic_object=UserIntent)
+    parser = JsonOutputParser(pydantic_object=UserIntent)
 
-        prompt = PromptTemplate(
-            template="""You are an expert intent classifier for a job assessment recommendation system.
+    prompt = PromptTemplate(
+        template="""You are an expert intent classifier for a job assessment recommendation system.
 
 Analyze this user query:
 "{query}"
@@ -37,33 +126,193 @@ Extract the following information into a strictly formatted JSON object:
 
 Return ONLY the JSON.
 """,
-            input_variables=["query"],
-            partial_variables={
-                "format_instructions": parser.get_format_instructions()
-            },
-        )
+        input_variables=["query"],
+        partial_variables={
+            "format_instructions": parser.get_format_instructions()
+        },
+    )
 
-        chain = prompt | llm | parser
+    return prompt | llm | parser
+
+
+def get_chain():
+    global _chain
+    if _chain is None:
+        with _chain_lock:
+            if _chain is None:
+                _chain = _build_chain()
+    return _chain
+
+
+def set_chain(chain):
+    # Swap the intent chain, e.g. for a deterministic stand-in in benchmarks.
+    # Anything with invoke/ainvoke({"query": ...}) -> dict works.
+    global _chain
+    with _chain_lock:
+        _chain = chain
+
+
+def _normalize_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    result["categories"] = set(result.get("categories", []))
+    return result
+
+
+def infer_intent_with_langchain(query: str) -> Optional[Dict[str, Any]]:
+    try:
+        chain = get_chain()
         result = chain.invoke({"query": query})
+        return _normalize_result(result)
+
+    except Exception as e:
+        LLM_ERRORS.inc()
+        print(f"GenAI Intent Error: {e}. Falling back to manual logic.")
+        return None
 
-        # normalize
-        result["categories"] = set(result.get("categories", []))
-        return result
+
+async def ainfer_intent_with_langchain(query: str) -> Optional[Dict[str, Any]]:
+    try:
+        chain = get_chain()
+        result = await chain.ainvoke({"query": query})
+        return _normalize_result(result)
 
     except Exception as e:
+        LLM_ERRORS.inc()
         print(f"GenAI Intent Error: {e}. Falling back to manual logic.")
         return None
 
 
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def copy_intent(intent: Dict[str, Any]) -> Dict[str, Any]:
+    result = dict(intent)
+    result["categories"] = set(intent.get("categories", []))
+    result["explicit_keywords"] = list(intent.get("explicit_keywords", []))
+    return result
+
+
+def intent_cache_stats() -> Dict[str, Any]:
+    return _intent_cache.stats()
+
+
+def clear_intent_cache() -> None:
+    _intent_cache.clear()
+    if semantic_cache is not None:
+        semantic_cache.clear()
+
+
 def infer_intent(query: str) -> Dict[str, Any]:
-    intent = infer_intent_with_langchain(query)
+    key = normalize_query(query)
+
+    cached = _intent_cache.get(key)
+    if cached is not None:
+        INTENT_SOURCE.inc(source="cache")
+        return copy_intent(cached)
+
+    fast_intent, confidence = classify_intent(query)
+    if confidence >= INTENT_FAST_PATH_THRESHOLD:
+        INTENT_SOURCE.inc(source="fast_path")
+        return fast_intent
+
+    # Single-flight: concurrent requests for the same query wait for the
+    # first LLM call instead of issuing their own.
+    with _inflight_lock:
+        key_lock = _inflight.setdefault(key, threading.Lock())
+
+    with key_lock:
+        cached = _intent_cache.peek(key)
+        if cached is not None:
+            INTENT_SOURCE.inc(source="cache")
+            return copy_intent(cached)
+
+        try:
+            intent = infer_intent_with_langchain(query)
+            if intent:
+                _intent_cache.set(key, intent)
+                INTENT_SOURCE.inc(source="llm")
+                return copy_intent(intent)
+        finally:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+
+    INTENT_SOURCE.inc(source="fallback")
+    return fast_intent
+
+
+async def _ainfer_and_cache(query: str, key: str) -> Optional[Dict[str, Any]]:
+    intent = await ainfer_intent_with_langchain(query)
     if intent:
-        return intent
-
-    return {
-        "categories": set(),
-        "explicit_keywords": [],
-        "behavioral": False,
-        "duration_max": None,
-        "is_entry_level": False,
-    }
+        _intent_cache.set(key, intent)
+    return intent
+
+
+async def _audit_semantic(query: str, key: str, borrowed: Dict[str, Any]):
+    # Background check of a borrowed intent against the LLM. The answer
+    # also lands in the exact cache, so this query stops borrowing.
+    intent = await _ainfer_and_cache(query, key)
+    if intent:
+        semantic_cache.record_audit(borrowed, intent)
+
+
+async def ainfer_intent_with_source(
+    query: str,
+    embed: Optional[Callable[[], Awaitable[np.ndarray]]] = None,
+    deadline: Optional[float] = INTENT_LLM_DEADLINE or None,
+) -> Tuple[Dict[str, Any], str]:
+    # Also reports how the intent was answered: "cache", "fast_path",
+    # "semantic", "llm", "fallback" (the LLM failed) or "timeout" (no LLM
+    # answer within `deadline` seconds); the last two use the classifier's
+    # intent. `embed` returns the query's embedding; when given, a close
+    # enough paraphrase in the semantic cache is used instead of the LLM,
+    # and LLM answers are added to that cache.
+    key = normalize_query(query)
+
+    cached = _intent_cache.get(key)
+    if cached is not None:
+        INTENT_SOURCE.inc(source="cache")
+        return copy_intent(cached), "cache"
+
+    fast_intent, confidence = classify_intent(query)
+    if confidence >= INTENT_FAST_PATH_THRESHOLD:
+        INTENT_SOURCE.inc(source="fast_path")
+        return fast_intent, "fast_path"
+
+    embedding = None
+    if embed is not None and semantic_cache is not None:
+        embedding = await embed()
+        match = semantic_cache.get(embedding)
+        if match is not None:
+            INTENT_SOURCE.inc(source="semantic")
+            if key not in _ainflight and random.random() < SEMANTIC_CACHE_AUDIT_RATE:
+                task = asyncio.ensure_future(_audit_semantic(query, key, match.entry.intent))
+                _audits.add(task)
+                task.add_done_callback(_audits.discard)
+            return copy_intent(match.entry.intent), "semantic"
+
+    # Concurrent requests for the same query share one in-flight LLM call.
+    future = _ainflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(_ainfer_and_cache(query, key))
+        _ainflight[key] = future
+        future.add_done_callback(lambda _: _ainflight.pop(key, None))
+
+    try:
+        intent = await asyncio.wait_for(asyncio.shield(future), timeout=deadline)
+    except asyncio.TimeoutError:
+        INTENT_SOURCE.inc(source="timeout")
+        return fast_intent, "timeout"
+
+    if intent:
+        if embedding is not None:
+            semantic_cache.add(key, embedding, intent)
+        INTENT_SOURCE.inc(source="llm")
+        return copy_intent(intent), "llm"
+
+    INTENT_SOURCE.inc(source="fallback")
+    return fast_intent, "fallback"
+
+
+async def ainfer_intent(query: str) -> Dict[str, Any]:
+    intent, _ = await ainfer_intent_with_source(query)
+    return intent
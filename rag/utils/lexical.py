@@ -0,0 +1,251 @@
+import hashlib
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from rag.store import StringTable
+
+TOKEN_RE = re.compile(r"[a-z0-9+#.]+")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Names are short but the strongest signal, so their tokens count twice.
+NAME_WEIGHT = 2
+
+FIELDS = ("name", "description")
+
+LEXICAL_FORMAT_VERSION = 2
+HEADER_FILE = "lexical.json"
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        token = token.rstrip(".")
+        if token:
+            tokens.append(token)
+    return tokens
+
+
+def trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def term_hash(term: str) -> int:
+    # Stable across processes, unlike hash().
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class Postings:
+    # Terms with CSR postings: term i occurs in rows
+    # rows[offsets[i]:offsets[i + 1]] (ascending), with optional per-row term
+    # frequencies alongside. Terms are ordered by a 64-bit hash, so a lookup
+    # is one searchsorted over `hashes` plus a string compare, and nothing
+    # has to be parsed into Python objects on load.
+
+    def __init__(
+        self,
+        terms: StringTable,
+        hashes: np.ndarray,
+        offsets: np.ndarray,
+        rows: np.ndarray,
+        tfs: Optional[np.ndarray] = None,
+    ):
+        self.terms = terms
+        self.hashes = hashes
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+
+    @classmethod
+    def build(cls, postings: Dict[str, List[int]], tfs: Optional[Dict[str, List[int]]] = None) -> "Postings":
+        terms = sorted(postings, key=lambda term: (term_hash(term), term))
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+        flat = lambda lists: np.array([v for term in terms for v in lists[term]], dtype=np.int32)
+        return cls(
+            StringTable.from_strings(terms),
+            np.array([term_hash(term) for term in terms], dtype=np.uint64),
+            offsets,
+            flat(postings),
+            flat(tfs) if tfs is not None else None,
+        )
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def find(self, term: str) -> int:
+        # Position of the term, or -1 when it is not indexed.
+        h = np.uint64(term_hash(term))
+        i = int(np.searchsorted(self.hashes, h))
+        while i < len(self.hashes) and self.hashes[i] == h:
+            if self.terms[i] == term:
+                return i
+            i += 1
+        return -1
+
+    def get(self, term: str) -> Optional[np.ndarray]:
+        i = self.find(term)
+        if i < 0:
+            return None
+        return self.rows[self.offsets[i]:self.offsets[i + 1]]
+
+    def save(self, directory: str, prefix: str) -> None:
+        path = lambda name: os.path.join(directory, f"{prefix}_{name}.npy")
+        np.save(path("terms_data"), self.terms.data)
+        np.save(path("terms_offsets"), self.terms.offsets)
+        np.save(path("hashes"), self.hashes)
+        np.save(path("offsets"), self.offsets)
+        np.save(path("rows"), self.rows)
+        if self.tfs is not None:
+            np.save(path("tfs"), self.tfs)
+
+    @classmethod
+    def load(cls, directory: str, prefix: str, mmap_mode: Optional[str] = "r") -> "Postings":
+        # Plain ndarray views of the maps: np.memmap's subclass hooks cost
+        # more than the few elements each lookup touches.
+        load = lambda name: np.asarray(
+            np.load(os.path.join(directory, f"{prefix}_{name}.npy"), mmap_mode=mmap_mode)
+        )
+        tfs_path = os.path.join(directory, f"{prefix}_tfs.npy")
+        return cls(
+            StringTable(load("terms_data"), load("terms_offsets")),
+            load("hashes"),
+            load("offsets"),
+            load("rows"),
+            load("tfs") if os.path.exists(tfs_path) else None,
+        )
+
+
+class LexicalIndex:
+    def __init__(self, size: int, doc_len: np.ndarray, tokens: Postings, grams: Dict[str, Postings]):
+        self.size = size
+        self.doc_len = doc_len
+        self.avgdl = float(doc_len.mean()) if size else 0.0
+        self.tokens = tokens
+        self.grams = grams
+
+    @classmethod
+    def build(cls, catalog: List[Dict]) -> "LexicalIndex":
+        doc_len = []
+        tokens = defaultdict(list)
+        tfs = defaultdict(list)
+        grams = {field: defaultdict(list) for field in FIELDS}
+
+        for row, item in enumerate(catalog):
+            name = item.get("name", "").lower()
+            desc = item.get("description", "").lower()
+
+            counts = Counter(tokenize(desc))
+            for token in tokenize(name):
+                counts[token] += NAME_WEIGHT
+            doc_len.append(sum(counts.values()))
+            for token, tf in counts.items():
+                tokens[token].append(row)
+                tfs[token].append(tf)
+
+            for field, text in (("name", name), ("description", desc)):
+                for gram in trigrams(text):
+                    grams[field][gram].append(row)
+
+        return cls(
+            len(catalog),
+            np.array(doc_len, dtype=np.int32),
+            Postings.build(tokens, tfs),
+            {field: Postings.build(postings) for field, postings in grams.items()},
+        )
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "doc_len.npy"), self.doc_len)
+        self.tokens.save(directory, "tokens")
+        for field, postings in self.grams.items():
+            postings.save(directory, f"{field}_grams")
+
+        with open(os.path.join(directory, HEADER_FILE), "w", encoding="utf-8") as f:
+            json.dump({"version": LEXICAL_FORMAT_VERSION, "size": self.size}, f)
+
+    @staticmethod
+    def is_current(directory: str) -> bool:
+        # False for a missing index or one written in an older format (the
+        # JSON postings of lexical_index.json), which is rebuilt instead.
+        try:
+            with open(os.path.join(directory, HEADER_FILE), "r", encoding="utf-8") as f:
+                return json.load(f).get("version") == LEXICAL_FORMAT_VERSION
+        except (OSError, ValueError):
+            return False
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "LexicalIndex":
+        with open(os.path.join(directory, HEADER_FILE), "r", encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("version") != LEXICAL_FORMAT_VERSION:
+            raise ValueError(f"Unsupported lexical index version in {directory}")
+
+        # Read-only memory maps, shared by every worker like the catalog store.
+        mmap_mode = "r" if mmap else None
+        return cls(
+            header["size"],
+            np.asarray(np.load(os.path.join(directory, "doc_len.npy"), mmap_mode=mmap_mode)),
+            Postings.load(directory, "tokens", mmap_mode),
+            {field: Postings.load(directory, f"{field}_grams", mmap_mode) for field in FIELDS},
+        )
+
+    def candidate_rows(self, text: str, field: str) -> Optional[np.ndarray]:
+        # Rows whose field may contain `text` as a substring: every trigram of
+        # the text must occur in the row. Callers still verify the substring.
+        # Texts shorter than a trigram cannot be narrowed down (None = all).
+        needed = trigrams(text)
+        if not needed:
+            return None
+
+        postings = self.grams[field]
+        lists = []
+        for gram in needed:
+            rows = postings.get(gram)
+            if rows is None or not len(rows):
+                return np.empty(0, dtype=np.int64)
+            lists.append(rows)
+
+        lists.sort(key=len)
+        rows = np.asarray(lists[0], dtype=np.int64)
+        for other in lists[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+            if not len(rows):
+                break
+        return rows
+
+    def search(self, terms: List[str], k: int = 20) -> List[Tuple[int, float]]:
+        query_tokens = set()
+        for term in terms:
+            query_tokens.update(tokenize(term))
+
+        # Per-token BM25 contributions, summed per row in token order.
+        rows, contributions = [], []
+        for token in sorted(query_tokens):
+            i = self.tokens.find(token)
+            if i < 0:
+                continue
+            start, end = self.tokens.offsets[i], self.tokens.offsets[i + 1]
+            postings = self.tokens.rows[start:end]
+            tf = self.tokens.tfs[start:end].astype(np.float64)
+
+            df = len(postings)
+            idf = math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[postings] / self.avgdl)
+            rows.append(postings)
+            contributions.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+
+        if not rows:
+            return []
+        unique, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(contributions))
+
+        ranked = np.lexsort((unique, -scores))[:k]
+        return [(int(unique[i]), float(scores[i])) for i in ranked]
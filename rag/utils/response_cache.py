@@ -0,0 +1,202 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from rag.utils.cache import TTLCache
+from rag.utils.intent import normalize_query
+from rag.utils.metrics import Counter
+
+# Whole-response cache for /recommend. For a fixed index version the
+# pipeline is deterministic, so responses are keyed by (normalized query,
+# index version) and hold the recommendations for the largest top_k
+# computed so far: rerank fills top_k greedily in a fixed order, so any
+# smaller top_k is a prefix of that list. A new index version changes every
+# key, and the old entries age out of the LRU.
+# With RESPONSE_CACHE_PATH set, entries are also written to a local SQLite
+# file that every worker on the host shares; each worker keeps its own
+# in-memory LRU in front of it. SQLite is only touched from one background
+# thread: async lookups that miss the LRU await it there, and writes are
+# queued behind the response (write-behind), so disk I/O never blocks the
+# event loop.
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "0"))
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "")
+
+LOOKUPS = Counter("response_cache_lookups_total", "Whole-response cache lookups.", ["result"])
+
+Items = List[Dict[str, Any]]
+
+
+def render_json(content: Dict[str, Any]) -> bytes:
+    # Same bytes as FastAPI's default JSONResponse.
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class CachedResult:
+    def __init__(self, top_k: int, items: Items):
+        self.top_k = top_k
+        self.items = items
+        # Rendered bodies per requested top_k, so a hit is a dict lookup.
+        self.bodies: Dict[int, bytes] = {}
+
+    def covers(self, top_k: int) -> bool:
+        # Fewer items than asked for means the candidate pool ran out, and
+        # a larger top_k would return the same list.
+        return top_k <= self.top_k or len(self.items) < self.top_k
+
+    def body(self, top_k: int, render: Callable[[Dict[str, Any]], bytes]) -> bytes:
+        body = self.bodies.get(top_k)
+        if body is None:
+            body = render({"recommended_assessments": self.items[:top_k]})
+            self.bodies[top_k] = body
+        return body
+
+
+class SqliteStore:
+    def __init__(self, path: str, maxsize: int, ttl: Optional[float] = None):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            # WAL lets workers read while another one writes.
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, top_k INTEGER, items TEXT, stored REAL, accessed REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def get(self, key: str) -> Optional[Tuple[int, Items]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT top_k, items, stored FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl and row[2] + self.ttl <= now):
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return row[0], json.loads(row[1])
+
+    def set(self, key: str, top_k: int, items: Items):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO responses (key, top_k, items, stored, accessed) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET top_k = excluded.top_k, items = excluded.items, "
+                "stored = excluded.stored, accessed = excluded.accessed "
+                "WHERE excluded.top_k > responses.top_k OR responses.stored + ? <= excluded.stored",
+                (key, top_k, json.dumps(items, ensure_ascii=False), now, now, self.ttl or float("inf"))
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        maxsize: int = RESPONSE_CACHE_SIZE,
+        ttl: Optional[float] = RESPONSE_CACHE_TTL or None,
+        path: Optional[str] = RESPONSE_CACHE_PATH or None,
+        render: Callable[[Dict[str, Any]], bytes] = render_json,
+    ):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.store = SqliteStore(path, maxsize, ttl) if path else None
+        # One thread keeps SQLite reads and writes in submission order.
+        self._executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache") if path else None
+        )
+        self.render = render
+
+    @staticmethod
+    def key(query: str, version: str) -> str:
+        return f"{version}\n{normalize_query(query)}"
+
+    def get(self, query: str, top_k: int, version: str) -> Optional[bytes]:
+        # The rendered response body, or None on a miss.
+        entry = self._lookup(query, top_k, version)
+        return None if entry is None else entry.body(top_k, self.render)
+
+    def items(self, query: str, top_k: int, version: str) -> Optional[Items]:
+        entry = self._lookup(query, top_k, version)
+        return None if entry is None else entry.items[:top_k]
+
+    async def aget(self, query: str, top_k: int, version: str) -> Optional[bytes]:
+        entry = await self._alookup(query, top_k, version)
+        return None if entry is None else entry.body(top_k, self.render)
+
+    async def aitems(self, query: str, top_k: int, version: str) -> Optional[Items]:
+        entry = await self._alookup(query, top_k, version)
+        return None if entry is None else entry.items[:top_k]
+
+    def _lookup(self, query: str, top_k: int, version: str) -> Optional[CachedResult]:
+        key = self.key(query, version)
+        entry = self.memory.get(key)
+        if entry is None and self.store is not None:
+            entry = self._executor.submit(self._load, key).result()
+        return self._counted(entry, top_k)
+
+    async def _alookup(self, query: str, top_k: int, version: str) -> Optional[CachedResult]:
+        key = self.key(query, version)
+        entry = self.memory.get(key)
+        if entry is None and self.store is not None:
+            loop = asyncio.get_running_loop()
+            entry = await loop.run_in_executor(self._executor, self._load, key)
+        return self._counted(entry, top_k)
+
+    def _load(self, key: str) -> Optional[CachedResult]:
+        stored = self.store.get(key)
+        if stored is None:
+            return None
+        entry = CachedResult(*stored)
+        self.memory.set(key, entry)
+        return entry
+
+    def _counted(self, entry: Optional[CachedResult], top_k: int) -> Optional[CachedResult]:
+        if entry is None or not entry.covers(top_k):
+            LOOKUPS.inc(result="miss")
+            return None
+        LOOKUPS.inc(result="hit")
+        return entry
+
+    def _store(self, key: str, top_k: int, items: Items):
+        # Runs on the cache thread after the response has gone out; a failed
+        # write only costs other workers a miss.
+        try:
+            self.store.set(key, top_k, items)
+        except sqlite3.Error as e:
+            print(f"Response cache write failed: {e}")
+
+    def put(self, query: str, top_k: int, version: str, items: Items):
+        key = self.key(query, version)
+        entry = self.memory.peek(key)
+        if entry is not None and entry.covers(top_k):
+            return
+        self.memory.set(key, CachedResult(top_k, items))
+        if self.store is not None:
+            self._executor.submit(self._store, key, top_k, items)
+
+    def clear(self):
+        self.memory.clear()
+        if self.store is not None:
+            # Queued behind pending writes, so none of them lands afterwards.
+            self._executor.submit(self.store.clear).result()
+
+    def stats(self) -> Dict[str, Any]:
+        return self.memory.stats()
@@ -0,0 +1,175 @@
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import faiss
+import numpy as np
+
+from rag.store import Hits
+from rag.utils.metrics import CallbackMetric, Counter
+
+# Intents of recent LLM-answered queries, searchable by query embedding.
+# Paraphrases ("Java dev with teamwork" / "Java developer, collaboration
+# skills") miss the exact-match intent cache, but their normalized
+# embeddings are close, so a query whose cosine similarity to a cached one
+# reaches SEMANTIC_CACHE_THRESHOLD borrows that query's intent instead of
+# calling the LLM. With SEMANTIC_CACHE_CANDIDATES=1 it also borrows the
+# cached query's primary vector hits for the same index version.
+# A sample of hits (SEMANTIC_CACHE_AUDIT_RATE) is re-checked against the LLM
+# in the background; the share of borrowed intents that disagree is the
+# drift to watch when tuning the threshold.
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+SEMANTIC_CACHE_CANDIDATES = os.getenv("SEMANTIC_CACHE_CANDIDATES", "0") == "1"
+SEMANTIC_CACHE_AUDIT_RATE = float(os.getenv("SEMANTIC_CACHE_AUDIT_RATE", "0.05"))
+
+LOOKUPS = Counter("semantic_cache_lookups_total", "Semantic intent cache lookups.", ["result"])
+AUDITS = Counter(
+    "semantic_cache_audits_total",
+    "Borrowed intents re-checked against the LLM, by whether they matched.",
+    ["result"],
+)
+
+
+def same_intent(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    # The fields that steer retrieval and rerank; keyword lists vary with
+    # wording even between good answers.
+    return (
+        set(a.get("categories", [])) == set(b.get("categories", []))
+        and bool(a.get("behavioral")) == bool(b.get("behavioral"))
+        and bool(a.get("is_entry_level")) == bool(b.get("is_entry_level"))
+        and a.get("duration_max") == b.get("duration_max")
+    )
+
+
+class Entry:
+    def __init__(self, key: str, intent: Dict[str, Any]):
+        self.key = key
+        self.intent = intent
+        # Primary vector hits by index version, when candidates are reused.
+        self.hits: Dict[str, Hits] = {}
+
+
+class Match:
+    def __init__(self, entry: Entry, similarity: float):
+        self.entry = entry
+        self.similarity = similarity
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        maxsize: int = SEMANTIC_CACHE_SIZE,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+    ):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        # Inner product of L2-normalized vectors is cosine similarity. The
+        # index is created on the first add, once the dimension is known.
+        self._index = None
+        self._entries: Dict[int, Entry] = {}
+        self._ids: Dict[str, int] = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.agreed = 0
+        self.differed = 0
+
+    @staticmethod
+    def _vector(embedding: np.ndarray) -> np.ndarray:
+        vector = np.array(embedding, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _search(self, embedding: np.ndarray) -> Optional[Match]:
+        if self._index is None or not self._entries:
+            return None
+        D, I = self._index.search(self._vector(embedding), 1)
+        if I[0][0] == -1 or D[0][0] < self.threshold:
+            return None
+        return Match(self._entries[int(I[0][0])], float(D[0][0]))
+
+    def get(self, embedding: np.ndarray) -> Optional[Match]:
+        with self._lock:
+            match = self._search(embedding)
+            if match is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        LOOKUPS.inc(result="miss" if match is None else "hit")
+        return match
+
+    def peek(self, embedding: np.ndarray) -> Optional[Match]:
+        with self._lock:
+            return self._search(embedding)
+
+    def add(self, key: str, embedding: np.ndarray, intent: Dict[str, Any]):
+        vector = self._vector(embedding)
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexIDMap(faiss.IndexFlatIP(vector.shape[1]))
+
+            stale = [self._ids.pop(key)] if key in self._ids else []
+            # Oldest first: ids grow with every add.
+            while len(self._entries) - len(stale) >= self.maxsize:
+                oldest = next(i for i in self._entries if i not in stale)
+                stale.append(oldest)
+                self._ids.pop(self._entries[oldest].key, None)
+            if stale:
+                self._index.remove_ids(np.array(stale, dtype=np.int64))
+                for entry_id in stale:
+                    del self._entries[entry_id]
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = Entry(key, intent)
+            self._ids[key] = entry_id
+
+    def set_hits(self, key: str, version: str, hits: Hits):
+        with self._lock:
+            entry_id = self._ids.get(key)
+            if entry_id is not None:
+                # Hits from older index versions are useless after a reload.
+                self._entries[entry_id].hits = {version: hits}
+
+    def record_audit(self, borrowed: Dict[str, Any], actual: Dict[str, Any]):
+        agreed = same_intent(borrowed, actual)
+        with self._lock:
+            if agreed:
+                self.agreed += 1
+            else:
+                self.differed += 1
+        AUDITS.inc(result="agree" if agreed else "differ")
+
+    def clear(self):
+        with self._lock:
+            if self._index is not None:
+                self._index.reset()
+            self._entries.clear()
+            self._ids.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            audits = self.agreed + self.differed
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "audits": audits,
+                "drift": self.differed / audits if audits else 0.0,
+            }
+
+
+semantic_cache = SemanticCache() if SEMANTIC_CACHE_SIZE > 0 else None
+
+if semantic_cache is not None:
+    CallbackMetric("semantic_cache_size", "Entries in the semantic intent cache.", "gauge", lambda: len(semantic_cache))
@@ -0,0 +1,36 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+# Per-request stage timings. A caller opens record_stages() around one
+# request; stage() blocks inside it (also in tasks spawned from it) add
+# their wall time under a name. Outside a recording, stage() costs one
+# context-variable lookup.
+_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "stage_timings", default=None
+)
+
+
+@contextmanager
+def record_stages() -> Iterator[Dict[str, float]]:
+    timings: Dict[str, float] = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
@@ -1,8 +1,14 @@
+import argparse
 import requests
-from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
 from urllib.parse import urljoin
 import json
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline.catalog import NON_TEXT_TAGS, TokenBucket, make_session
+from pipeline.http_cache import HTTP_CACHE_DIR, HttpCache, cached_get
 
 
 BASE_URL = "https://www.shl.com"
@@ -15,29 +21,74 @@ HEADERS = {
 PAGE_SIZE = 12
 TYPE = 1
 
-session = requests.Session()
+# Politeness: up to WINDOW listing pages are in flight at once, but requests
+# start no faster than REQUEST_RATE per second (bursts of REQUEST_BURST).
+WINDOW = 4
+REQUEST_RATE = 1.0
+REQUEST_BURST = 2
+
+OUTPUT_FILE = "data/raw/catalog_metadata.json"
+
+# Bump when the listing parser changes so cached parser output is redone.
+PARSER_VERSION = 1
+
+session = make_session(WINDOW)
 session.headers.update(HEADERS)
+bucket = TokenBucket(REQUEST_RATE, REQUEST_BURST)
+
+# Listing pages are fetched conditionally; unchanged ones are not re-parsed.
+cache = HttpCache(HTTP_CACHE_DIR) if HTTP_CACHE_DIR else None
+
+# Set once the last page is found; in-flight fetches give up at the next
+# request or retry instead of finishing pages nobody will read.
+stop = threading.Event()
+
 
-def safe_get(url, params, retries=5, timeout=30):
+class Cancelled(Exception):
+    pass
+
+
+def safe_get(url, params, retries=5, timeout=30, headers=None):
     for attempt in range(retries):
+        bucket.acquire()
+        if stop.is_set():
+            raise Cancelled(url)
         try:
-            r = session.get(url, params=params, timeout=timeout)
+            r = session.get(url, params=params, headers=headers, timeout=timeout)
             r.raise_for_status()
             return r
         except requests.RequestException as e:
             wait = 5 * (attempt + 1)
             print(f"[WARN] {e} → retrying in {wait}s")
-            time.sleep(wait)
+            if stop.wait(wait):
+                raise Cancelled(url)
     raise RuntimeError("Max retries exceeded")
 
 
+def _class_xpath(tag, cls):
+    return etree.XPath(f'.//{tag}[contains(concat(" ", normalize-space(@class), " "), " {cls} ")]')
+
+
+# Compiled once; the same selections the BeautifulSoup version made with
+# CSS selectors.
+ROWS = etree.XPath("//tr[@data-entity-id]")
+CELLS = etree.XPath(".//td")
+VIEW_LINK = etree.XPath(".//a[contains(@href, '/product-catalog/view/')]")
+FIRST_SPAN = etree.XPath("(.//span)[1]")
+KEYS = _class_xpath("span", "product-catalogue__key")
+
+
+def _text(element):
+    return "".join(t.strip() for t in element.itertext() if t.strip())
+
+
 def yes_no_from_td(td):
 
-    span = td.select_one("span")
+    span = FIRST_SPAN(td)
     if not span:
         return "No"
 
-    classes = " ".join(span.get("class", [])).lower()
+    classes = " ".join(span[0].get("class", "").split()).lower()
     if "yes" in classes:
         return "Yes"
     return "No"
@@ -48,30 +99,47 @@ def scrape_page(start):
         "type": TYPE
     }
 
-    r = safe_get(CATALOG_URL, params=params)
-    soup = BeautifulSoup(r.text, "lxml")
+    page = cached_get(
+        cache, CATALOG_URL,
+        lambda headers: safe_get(CATALOG_URL, params=params, headers=headers),
+        params
+    )
+    records = page.parsed(PARSER_VERSION)
+    if records is None:
+        records = parse_listing(page.text)
+        if cache is not None:
+            cache.store_parsed(page, records, PARSER_VERSION)
+    return records
+
+
+def parse_listing(html):
+    try:
+        doc = lxml.html.fromstring(html.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8"))
+    except etree.ParserError:
+        return []
+    etree.strip_elements(doc, *NON_TEXT_TAGS, with_tail=False)
 
     records = []
 
-    rows = soup.select("tr[data-entity-id]")
+    rows = ROWS(doc)
     for row in rows:
-        tds = row.find_all("td")
+        tds = CELLS(row)
         if len(tds) < 4:
             continue
 
-        link = tds[0].select_one("a[href*='/product-catalog/view/']")
+        link = VIEW_LINK(tds[0])
         if not link:
             continue
 
-        url = urljoin(BASE_URL, link["href"])
-        name = link.get_text(strip=True)
+        url = urljoin(BASE_URL, link[0].get("href"))
+        name = _text(link[0])
 
         remote_support = yes_no_from_td(tds[1])
         adaptive_support = yes_no_from_td(tds[2])
 
         test_types = []
-        for span in tds[3].select("span.product-catalogue__key"):
-            code = span.get_text(strip=True)
+        for span in KEYS(tds[3]):
+            code = _text(span)
             if code:
                 test_types.append(code)
 
@@ -86,32 +154,61 @@ def scrape_page(start):
     return records
 
 
-def scrape_all():
+def scrape_all(window=WINDOW):
+    # Keeps `window` pages in flight and consumes them strictly in page
+    # order, so records merge by URL exactly as a sequential walk would.
+    # The first empty page ends the walk; pages queued past it are
+    # cancelled and running ones stop at their next request.
     all_records = {}
-    start = 1
-
-    while True:
-        print(f"Scraping{start}")
-        records = scrape_page(start)
-
-        if not records:
-            print("No more rows")
-            break
-
-        for r in records:
-            all_records[r["url"]] = r 
-
-        print(f"  Total products collected: {len(all_records)}")
+    stop.clear()
+    executor = ThreadPoolExecutor(max_workers=window)
+    pending = []
+    next_start = 1
+
+    try:
+        while True:
+            while len(pending) < window:
+                pending.append((next_start, executor.submit(scrape_page, next_start)))
+                next_start += PAGE_SIZE
+
+            start, future = pending.pop(0)
+            print(f"Scraping{start}")
+            records = future.result()
+
+            if not records:
+                print("No more rows")
+                break
+
+            for r in records:
+                all_records[r["url"]] = r 
+
+            print(f"  Total products collected: {len(all_records)}")
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    if cache is not None:
+        print(f"HTTP cache: {cache.summary()}")
+    return list(all_records.values())
 
-        start += PAGE_SIZE
-        time.sleep(2) 
 
-    return list(all_records.values())
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape the SHL product catalog listing.")
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--window", type=int, default=WINDOW, help="Listing pages in flight at once")
+    parser.add_argument("--rate", type=float, default=REQUEST_RATE, help="Average requests per second")
+    parser.add_argument("--burst", type=int, default=REQUEST_BURST, help="Requests allowed back to back")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    data = scrape_all()
+    args = parse_args()
+    session = make_session(args.window)
+    session.headers.update(HEADERS)
+    bucket = TokenBucket(args.rate, args.burst)
+
+    data = scrape_all(args.window)
     print("\nFINAL COUNT:", len(data))
 
-    with open("data/raw/catalog_metadata.json", "w") as f:
+    with open(args.output, "w") as f:
         json.dump(data, f, indent=2)
@@ -0,0 +1,64 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import app
+from rag.store import Hits
+from rag.utils.semantic_cache import SemanticCache
+
+INTENT = {
+    "categories": [],
+    "explicit_keywords": [],
+    "behavioral": False,
+    "is_entry_level": False,
+    "duration_max": None,
+}
+
+
+@pytest.fixture
+def llm_pipeline(monkeypatch):
+    # /recommend with an LLM-answered intent and no index: encoding,
+    # retrieval and rerank are replaced, the control flow around them is not.
+    async def intent(query, embed=None, deadline=None):
+        await asyncio.sleep(0)
+        return dict(INTENT), "llm"
+
+    async def encode(queries):
+        return np.ones((len(queries), 4), dtype=np.float32)
+
+    async def retrieve(queries, ks, snapshot=None, embeddings=None):
+        return [Hits(np.arange(3, dtype=np.int64), np.ones(3, dtype=np.float32)) for _ in queries]
+
+    monkeypatch.setattr(app, "get_snapshot", lambda: SimpleNamespace(version="v1"))
+    monkeypatch.setattr(app, "response_cache", None)
+    monkeypatch.setattr(app, "SPECULATIVE_RETRIEVAL", True)
+    monkeypatch.setattr(app, "SEMANTIC_CACHE_CANDIDATES", True)
+    monkeypatch.setattr(app, "ainfer_intent_with_source", intent)
+    monkeypatch.setattr(app, "aencode_queries", encode)
+    monkeypatch.setattr(app, "aretrieve_many", retrieve)
+    monkeypatch.setattr(
+        app, "recommend_from_retrieved",
+        lambda query, intent, retrieved, top_k, snapshot=None: {"recommended_assessments": []},
+    )
+
+
+def recommend(query: str):
+    return asyncio.run(app.recommend(app.QueryRequest(query=query, top_k=5)))
+
+
+def test_candidates_without_semantic_cache(llm_pipeline, monkeypatch):
+    # SEMANTIC_CACHE_SIZE=0 with SEMANTIC_CACHE_CANDIDATES=1.
+    monkeypatch.setattr(app, "semantic_cache", None)
+    assert recommend("java developer") == {"recommended_assessments": []}
+
+
+def test_candidates_stored_on_llm_intent(llm_pipeline, monkeypatch):
+    cache = SemanticCache(maxsize=4)
+    cache.add("java developer", np.ones(4, dtype=np.float32), dict(INTENT))
+    monkeypatch.setattr(app, "semantic_cache", cache)
+
+    recommend("java developer")
+    match = cache.peek(np.ones(4, dtype=np.float32))
+    assert match.entry.hits["v1"].rows.tolist() == [0, 1, 2]
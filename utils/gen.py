@@ -1,3 +1,9 @@
+import argparse
+import asyncio
+import json
+import random
+import httpx
+import numpy as np
 import pandas as pd
 import requests
 import sys
@@ -5,9 +11,20 @@ import time
 from pathlib import Path
 
 API_URL = "http://localhost:8000/recommend"
+BATCH_API_URL = "http://localhost:8000/recommend/batch"
 TOP_K = 10
 MAX_RETRIES = 3
 RETRY_DELAY = 2
+BATCH_SIZE = 32
+CONCURRENCY = 8
+
+
+def extract_urls(data):
+    if isinstance(data, list):
+        return [item["url"] for item in data if "url" in item]
+    if isinstance(data, dict) and "recommended_assessments" in data:
+        return [item["url"] for item in data["recommended_assessments"]]
+    return None
 
 
 def fetch_recommendations(query: str, top_k: int = 10, retries: int = MAX_RETRIES):
@@ -21,12 +38,8 @@ def fetch_recommendations(query: str, top_k: int = 10, retries: int = MAX_RETRIE
             r.raise_for_status()
             data = r.json()
 
-            urls = []
-            if isinstance(data, list):
-                urls = [item["url"] for item in data if "url" in item]
-            elif isinstance(data, dict) and "recommended_assessments" in data:
-                urls = [item["url"] for item in data["recommended_assessments"]]
-            else:
+            urls = extract_urls(data)
+            if urls is None:
                 print(f"  Warning: Unexpected response format for query: {query[:60]}...")
                 if attempt < retries - 1:
                     time.sleep(RETRY_DELAY)
@@ -62,6 +75,112 @@ def fetch_recommendations(query: str, top_k: int = 10, retries: int = MAX_RETRIE
     return []
 
 
+def backoff_delay(attempt: int) -> float:
+    # Exponential backoff with full jitter so concurrent retries spread out.
+    return random.uniform(0, RETRY_DELAY * (2 ** attempt))
+
+
+async def afetch_recommendations(client: httpx.AsyncClient, query: str, top_k: int = 10, retries: int = MAX_RETRIES):
+    for attempt in range(retries):
+        try:
+            r = await client.post(API_URL, json={"query": query, "top_k": top_k})
+            r.raise_for_status()
+
+            urls = extract_urls(r.json())
+            if urls is None:
+                print(f"  Warning: Unexpected response format for query: {query[:60]}...")
+            else:
+                if len(urls) < top_k:
+                    print(f"  Warning: Only {len(urls)} recommendations returned (expected {top_k})")
+                return urls
+
+        except httpx.TimeoutException:
+            print(f"  Timeout on attempt {attempt + 1}/{retries}: {query[:60]}...")
+
+        except httpx.HTTPError as e:
+            print(f"  Request error on attempt {attempt + 1}/{retries}: {e}")
+
+        except Exception as e:
+            print(f"  Error on attempt {attempt + 1}/{retries}: {e}")
+
+        if attempt < retries - 1:
+            await asyncio.sleep(backoff_delay(attempt))
+
+    return []
+
+
+def print_throughput_report(total: int, elapsed: float, latencies):
+    print("\n" + "-" * 80)
+    print(f"Processed {total} queries in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.2f} queries/s)")
+    if latencies:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print(f"Latency p50: {p50:.3f}s | p95: {p95:.3f}s | p99: {p99:.3f}s | max: {max(latencies):.3f}s")
+    print("-" * 80 + "\n")
+
+
+async def fetch_all_concurrent(queries, top_k: int = 10, concurrency: int = CONCURRENCY):
+    results = [[] for _ in queries]
+    latencies = []
+    completed = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def run(idx, query):
+            nonlocal completed
+            async with semaphore:
+                started = time.perf_counter()
+                results[idx] = await afetch_recommendations(client, query, top_k)
+                latencies.append(time.perf_counter() - started)
+
+            completed += 1
+            elapsed = time.perf_counter() - t0
+            print(
+                f"[{completed}/{len(queries)}] {len(results[idx])} recommendations "
+                f"({completed / elapsed:.2f} queries/s): {query[:60]}..."
+            )
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(run(idx, query) for idx, query in enumerate(queries)))
+        elapsed = time.perf_counter() - t0
+
+    print_throughput_report(len(queries), elapsed, latencies)
+    return results
+
+
+def fetch_batch_recommendations(queries, top_k: int = 10, retries: int = MAX_RETRIES):
+    results = {}
+
+    for attempt in range(retries):
+        remaining = [q for q in queries if q not in results]
+        if not remaining:
+            break
+
+        try:
+            with requests.post(
+                BATCH_API_URL,
+                json={"queries": remaining, "top_k": top_k},
+                timeout=60,
+                stream=True
+            ) as r:
+                r.raise_for_status()
+                for line in r.iter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    query = remaining[data["index"]]
+                    urls = [item["url"] for item in data.get("recommended_assessments", [])]
+                    results[query] = urls
+                    print(f"  [{len(results)}/{len(queries)}] {len(urls)} recommendations: {query[:60]}...")
+
+        except requests.exceptions.RequestException as e:
+            print(f"  Batch request error on attempt {attempt + 1}/{retries}: {e}")
+            if attempt < retries - 1:
+                time.sleep(RETRY_DELAY * (attempt + 1))
+
+    return results
+
+
 def validate_input_csv(df: pd.DataFrame) -> bool:
     if "Query" not in df.columns:
         print("Error: Input CSV must contain 'Query' column")
@@ -72,14 +191,31 @@ def validate_input_csv(df: pd.DataFrame) -> bool:
     return True
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate recommendations for every query in a CSV")
+    parser.add_argument("input_csv", nargs="?", default="data/result/test.csv")
+    parser.add_argument("output_csv", nargs="?", default=None)
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Send queries to /recommend/batch and stream the results back"
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=0,
+        help="Send up to N /recommend requests in parallel over a pooled async client"
+    )
+    return parser.parse_args()
+
+
 def main():
-    if len(sys.argv) > 1:
-        input_csv = sys.argv[1]
-    else:
-        input_csv = "data/result/test.csv"
+    args = parse_args()
+    input_csv = args.input_csv
     
-    if len(sys.argv) > 2:
-        output_csv = sys.argv[2]
+    if args.output_csv:
+        output_csv = args.output_csv
     else:
         input_path = Path(input_csv)
         output_csv = str(input_path.parent / f"{input_path.stem}_result.csv")
@@ -90,7 +226,7 @@ def main():
     
     print(f"Reading input from: {input_csv}")
     print(f"Output will be written to: {output_csv}")
-    print(f"API endpoint: {API_URL}")
+    print(f"API endpoint: {BATCH_API_URL if args.batch else API_URL}")
     print(f"Top K: {TOP_K}\n")
     
     try:
@@ -111,10 +247,26 @@ def main():
     rows = []
     failed_queries = []
 
+    batch_results = {}
+    if args.batch:
+        for start in range(0, total_queries, args.batch_size):
+            chunk = list(unique_queries[start:start + args.batch_size])
+            print(f"Sending batch of {len(chunk)} queries ({start + 1}-{start + len(chunk)}/{total_queries})")
+            batch_results.update(fetch_batch_recommendations(chunk, TOP_K))
+        print()
+    elif args.concurrency > 0:
+        print(f"Sending up to {args.concurrency} concurrent requests\n")
+        concurrent_urls = asyncio.run(
+            fetch_all_concurrent(list(unique_queries), TOP_K, args.concurrency)
+        )
+        batch_results = dict(zip(unique_queries, concurrent_urls))
+
     for idx, query in enumerate(unique_queries, 1):
-        print(f"[{idx}/{total_queries}] Processing query: {query[:80]}...")
-        
-        urls = fetch_recommendations(query, TOP_K)
+        if args.batch or args.concurrency > 0:
+            urls = batch_results.get(query, [])
+        else:
+            print(f"[{idx}/{total_queries}] Processing query: {query[:80]}...")
+            urls = fetch_recommendations(query, TOP_K)
 
         if not urls:
             print(f"  ERROR: No recommendations returned for this query\n")
@@ -127,7 +279,8 @@ def main():
                 "Assessment_url": url
             })
 
-        print(f"  Success: Retrieved {len(urls)} recommendations\n")
+        if not (args.batch or args.concurrency > 0):
+            print(f"  Success: Retrieved {len(urls)} recommendations\n")
 
     if failed_queries:
         print(f"\nWarning: {len(failed_queries)} queries failed to return recommendations")